@@ -1,52 +1,2728 @@
-import cv2
-import numpy as np
-import pyautogui
 import time
+STARTUP_BEGAN = time.perf_counter()  # For --startup-profile
 import random
+import abc
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
+import tkinter.font as tkfont
 import threading
+import heapq
+import bisect
+import itertools
+import collections
+import atexit
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
 import json
 import os
+import sys
+import signal
+import importlib
+import multiprocessing
+import queue
+import zlib
+import importlib.util
 
 
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access
+
+    Attributes set before then are kept and applied on import, so configuring the module does not load it.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._settings = {}
+       
+    def __getattr__(self, attr):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            for setting, value in self._settings.items():
+                setattr(module, setting, value)
+            self._module = module
+        return getattr(self._module, attr)
+   
+    def __setattr__(self, attr, value):
+        if attr.startswith("_"):
+            object.__setattr__(self, attr, value)
+        elif self._module is None:
+            self._settings[attr] = value
+        else:
+            setattr(self._module, attr, value)
+
+# OpenCV/NumPy add noticeable startup time and RSS; only capture and verification need them.
+# pyautogui has to be lazy as well: it imports pyscreeze, which imports cv2 and numpy whenever they are
+# installed. Without a usable display it fails on first use rather than at startup.
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+pyautogui = LazyModule("pyautogui")
+
+class StartupProfile:
+    """Wall-clock breakdown of application startup"""
+    def __init__(self, began):
+        self.last = began
+        self.phases = []  # (phase, seconds)
+       
+    def mark(self, phase):
+        """Close the current phase"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+       
+    def report(self):
+        lines = ["Startup profile:"]
+        for phase, seconds in self.phases:
+            lines.append(f"  {phase:<20} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<20} {sum(seconds for _, seconds in self.phases) * 1000:8.1f} ms")
+        loaded = " ".join(f"{name}={name in sys.modules}" for name in ("pyautogui", "cv2", "numpy"))
+        lines.append(f"  modules loaded: {loaded}")
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            lines.append(f"  peak RSS: {peak / (1024 * 1024 if sys.platform == 'darwin' else 1024):.1f} MB")
+        except ImportError:
+            pass  # Not available on Windows
+        return "\n".join(lines)
+
+STARTUP = StartupProfile(STARTUP_BEGAN)
+
+
+VERIFY_MODES = ("ocr", "template")
+
+class CircuitBreaker:
+    """Quarantines an instance after repeated failed commands and lets single probes through until it recovers
+
+    Fed by the dispatcher (send failures) and the verification workers (verdicts), hence the lock.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+   
+    def __init__(self, failure_threshold=3, base_backoff=30.0, max_backoff=1800.0):
+        self.failure_threshold = failure_threshold  # Consecutive failed commands before quarantine
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.RLock()
+        self.reset()
+       
+    def reset(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trips = 0  # Quarantines in a row without recovering; doubles the backoff each time
+            self.open_until = 0
+       
+    def allow(self, now):
+        """Whether a command may be sent now; an expired quarantine turns into a half-open probe"""
+        with self.lock:
+            if self.state == self.OPEN and now >= self.open_until:
+                self.state = self.HALF_OPEN
+            return self.state != self.OPEN
+   
+    def record(self, success, now):
+        """Track a command outcome; returns the new state if it changed, else None"""
+        with self.lock:
+            previous = self.state
+            if success:
+                self.reset()
+            else:
+                self.failures += 1
+                if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                    self.trips += 1
+                    self.state = self.OPEN
+                    self.open_until = now + self.backoff()
+            return self.state if self.state != previous else None
+   
+    def backoff(self):
+        return min(self.base_backoff * 2 ** max(self.trips - 1, 0), self.max_backoff)
+   
+    def describe(self, now):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return f"ok ({self.failures} recent failures)" if self.failures else "ok"
+            if self.state == self.HALF_OPEN:
+                return "probing"
+            return f"quarantined, probe in {max(0, int(self.open_until - now))} seconds (trip {self.trips})"
+
+def parse_timetable(text):
+    """Parse 'command:interval[:offset], ...' into timetable entries"""
+    entries = []
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        parts = [part.strip() for part in item.split(":")]
+        if len(parts) not in (2, 3) or not parts[0]:
+            raise ValueError(f"Expected command:interval[:offset], got '{item.strip()}'")
+        interval, offset = float(parts[1]), float(parts[2]) if len(parts) == 3 else 0
+        if interval <= 0 or offset < 0:
+            raise ValueError(f"Interval must be positive and offset not negative in '{item.strip()}'")
+        entries.append([parts[0], interval, offset])
+    return entries
+
 class MudaeInstance:
-    def __init__(self, name, chat_region, w_interval, rolls_interval):
+    def __init__(self, name, chat_region, w_interval, rolls_interval, verify_mode="ocr", display=None, tags=None,
+                 timetable=None):
         self.name = name
         self.chat_region = chat_region
-        self.w_interval = w_interval
-        self.rolls_interval = rolls_interval
-        self.last_w_time = 0
-        self.last_rolls_time = 0
-        self.running = False
-        self.paused = False
+        # [command, interval, offset] entries; the offset delays a command's first send after starting
+        if timetable:
+            self.timetable = [list(entry) for entry in timetable]
+        else:
+            self.timetable = [[command, interval, 0] for command, interval in
+                              ((".w", w_interval), (".rolls", rolls_interval)) if interval is not None]
+        self.verify_mode = verify_mode  # "ocr" or "template"
+        self.display = display  # X display to run on in sharded mode (None = any)
+        self.tags = list(tags or [])  # Group tags for bulk start/pause/stop
+        self.last_sent_times = {}  # Command -> monotonic time it was last sent
+        self.cooldown_until = 0
+       
+        # Run state as events so waits wake up the moment an instance is stopped or paused
+        self.stopped = threading.Event()
+        self.stopped.set()
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self.idle = threading.Event()  # Cleared while a command is being sent
+        self.idle.set()
+        self.send_attempts = {}  # Command being retried -> (failed attempts, monotonic time of the first)
+        self.breaker = CircuitBreaker()
+       
+        # Verification state
+        self.change_detector = FrameChangeDetector()
+        self.verify_lock = threading.Lock()
+        self.ocr_runs = 0
+        self.ocr_skipped = 0
+
+    @property
+    def running(self):
+        return not self.stopped.is_set()
+       
+    @running.setter
+    def running(self, value):
+        if value:
+            self.stopped.clear()
+        else:
+            self.stopped.set()
+           
+    @property
+    def paused(self):
+        return not self.resumed.is_set()
+       
+    @paused.setter
+    def paused(self, value):
+        if value:
+            self.resumed.clear()
+        else:
+            self.resumed.set()
+           
+    @property
+    def active(self):
+        """Whether commands may be sent right now"""
+        return self.running and not self.paused
+       
+    @property
+    def status(self):
+        """Human readable run state"""
+        if not self.running:
+            return "Stopped"
+        if self.paused:
+            return "Paused"
+        return "Running" if self.breaker.state == CircuitBreaker.CLOSED else "Quarantined"
+       
+    @property
+    def w_interval(self):
+        return self.interval_for(".w")
+   
+    @w_interval.setter
+    def w_interval(self, value):
+        self.set_interval(".w", value)
+   
+    @property
+    def rolls_interval(self):
+        return self.interval_for(".rolls")
+   
+    @rolls_interval.setter
+    def rolls_interval(self, value):
+        self.set_interval(".rolls", value)
        
     def to_dict(self):
-        return {
+        data = {
             'name': self.name,
             'chat_region': self.chat_region,
-            'w_interval': self.w_interval,
-            'rolls_interval': self.rolls_interval
+            'verify_mode': self.verify_mode,
+            'display': self.display,
+            'tags': self.tags,
+            'timetable': self.timetable
+        }
+        # Kept for older versions, which only read these; a timetable without the command has neither
+        for key in ('w_interval', 'rolls_interval'):
+            if getattr(self, key) is not None:
+                data[key] = getattr(self, key)
+        return data
+   
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['name'],
+            data['chat_region'],
+            data.get('w_interval'),
+            data.get('rolls_interval'),
+            data.get('verify_mode', "ocr"),
+            data.get('display'),
+            data.get('tags', []),
+            data.get('timetable')
+        )
+
+    def commands(self):
+        """Every command on the timetable"""
+        return [entry[0] for entry in self.timetable]
+   
+    def interval_for(self, command):
+        """Return the repeat interval of a scheduled command (None if it is not on the timetable)"""
+        return next((interval for name, interval, _ in self.timetable if name == command), None)
+   
+    def set_interval(self, command, interval):
+        """Change a command's repeat interval, adding it to the timetable if it is not on it"""
+        for entry in self.timetable:
+            if entry[0] == command:
+                entry[1] = interval
+                return
+        self.timetable.append([command, interval, 0])
+   
+    def offset_for(self, command):
+        """Return how long after starting a never-sent command is first sent"""
+        return next((offset for name, _, offset in self.timetable if name == command), 0)
+
+    def last_sent(self, command):
+        """Return when a scheduled command was last sent (monotonic seconds)"""
+        return self.last_sent_times.get(command, 0)
+
+    def seconds_until(self, command, now):
+        """Return how long until a scheduled command is due again (0 if never sent)"""
+        last_sent = self.last_sent(command)
+        if not last_sent:
+            return 0
+        return max(0, self.interval_for(command) - (now - last_sent))
+
+    def mark_sent(self, command, when):
+        """Record when a scheduled command was sent"""
+        self.last_sent_times[command] = when
+
+class FrameChangeDetector:
+    """Tells whether a region changed since the last analysed frame, comparing area-averaged thumbnails cell by cell
+
+    A change anywhere counts, however small the rest of the region makes it look: one new chat line
+    in a large region changes a few dozen cells and nothing else.
+    """
+    def __init__(self, cell=4, cell_threshold=12, min_changed_cells=2):
+        self.cell = cell  # Each thumbnail cell averages a cell x cell block, so thin text strokes still show
+        self.cell_threshold = cell_threshold  # Channel difference (0-255) above which a cell changed
+        self.min_changed_cells = min_changed_cells  # Changed cells that make a changed frame
+        self.last = None
+       
+    def changed(self, frame):
+        """Return True (and remember the frame) if it differs from the last analysed one"""
+        height, width = frame.shape[:2]
+        size = (max(1, width // self.cell), max(1, height // self.cell))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if self.last is not None and self.last.shape == small.shape:
+            difference = cv2.absdiff(small, self.last).max(axis=2)
+            if np.count_nonzero(difference > self.cell_threshold) < self.min_changed_cells:
+                return False
+        self.last = small
+        return True
+   
+    def reset(self):
+        self.last = None
+
+TEMPLATE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+def load_template_images(template_dir):
+    """(name, grayscale image) for every readable image in a directory, by file name; none if it is missing"""
+    templates = []
+    if not os.path.isdir(template_dir):
+        return templates
+    for filename in sorted(os.listdir(template_dir)):
+        if not filename.lower().endswith(TEMPLATE_EXTENSIONS):
+            continue
+        image = cv2.imread(os.path.join(template_dir, filename), cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            templates.append((os.path.splitext(filename)[0], image))
+    return templates
+
+class TemplateVerifier:
+    """Finds known Mudae reply elements in the newest rows of a region with cv2.matchTemplate"""
+   
+    def __init__(self, template_dir="mudae_templates", threshold=0.8, search_fraction=0.4):
+        self.template_dir = template_dir  # Crops of embed borders, reaction buttons, "rolls left" footers...
+        self.threshold = threshold  # Minimum normalized correlation for a match
+        self.search_fraction = search_fraction  # Bottom part of the region holding the newest messages
+        self.templates = self.load_templates()
+       
+    def load_templates(self):
+        """Load every template image once, already converted to grayscale"""
+        return load_template_images(self.template_dir)
+   
+    def match(self, frame):
+        """Return (template name, score) of the first template found in an RGB frame, or None"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        height, width = gray.shape
+        newest_rows = int(height * (1 - self.search_fraction))
+       
+        for name, template in self.templates:
+            template_height, template_width = template.shape
+            if template_height > height or template_width > width:
+                continue
+            window = gray[min(newest_rows, height - template_height):]
+            result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, _ = cv2.minMaxLoc(result)
+            if score >= self.threshold:
+                return name, score
+        return None
+
+_template_verifier = None
+
+def get_template_verifier():
+    """Return the process-wide TemplateVerifier, loading the templates on first use"""
+    global _template_verifier
+    if _template_verifier is None:
+        _template_verifier = TemplateVerifier()
+    return _template_verifier
+
+def effective_verify_mode(mode):
+    """The verify mode actually used: template mode falls back to OCR while no templates are installed"""
+    if mode == "template" and not get_template_verifier().templates:
+        return "ocr"  # Nothing could ever match, which would fail every command
+    return mode
+
+def analyze_reply_frame(frame, mode):
+    """Return True if an RGB frame of a chat region shows an expected Mudae reply"""
+    if effective_verify_mode(mode) == "template":
+        return get_template_verifier().match(frame) is not None
+   
+    import pytesseract  # Requires pip install pytesseract and Tesseract OCR installed
+    text = pytesseract.image_to_string(frame).lower()
+   
+    # Check for expected response (customize based on Mudae bot responses)
+    return "rolled" in text or "claimed" in text  # Example keywords
+
+def analyze_shared_frame(shm_name, shape, mode):
+    """Worker-process entry point: analyze a frame published in shared memory"""
+    # Pool workers share the parent's resource tracker, so attaching here does not take over cleanup
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        verified = analyze_reply_frame(frame, mode)
+        del frame  # Release the view before closing the block
+        return verified
+    finally:
+        shm.close()
+
+# Discord dark theme colours (RGB) of a channel view and its message box
+CHAT_BACKGROUND = (49, 51, 56)
+CHAT_INPUT_FILL = (56, 58, 64)
+CHAT_INPUT_ICON = (181, 186, 193)
+CHAT_INPUT_TEXT = (130, 134, 142)
+
+def draw_chat_input(image, x, y, width, scale=1.0, text="Message #mudae"):
+    """Draw a Discord-style message box onto an RGB image; returns its (x, y, w, h)"""
+    height, radius = round(44 * scale), round(8 * scale)
+    cv2.rectangle(image, (x + radius, y), (x + width - 1 - radius, y + height - 1), CHAT_INPUT_FILL, -1)
+    cv2.rectangle(image, (x, y + radius), (x + width - 1, y + height - 1 - radius), CHAT_INPUT_FILL, -1)
+    for corner_x in (x + radius, x + width - 1 - radius):
+        for corner_y in (y + radius, y + height - 1 - radius):
+            cv2.circle(image, (corner_x, corner_y), radius, CHAT_INPUT_FILL, -1, cv2.LINE_AA)
+           
+    # "+" attachment button on the left, emoji/gift buttons on the right
+    center_y = y + height // 2
+    icon_x, icon_radius, arm = x + round(28 * scale), round(12 * scale), round(6 * scale)
+    cv2.circle(image, (icon_x, center_y), icon_radius, CHAT_INPUT_ICON, -1, cv2.LINE_AA)
+    thickness = max(1, round(2 * scale))
+    cv2.line(image, (icon_x - arm, center_y), (icon_x + arm, center_y), CHAT_INPUT_FILL, thickness)
+    cv2.line(image, (icon_x, center_y - arm), (icon_x, center_y + arm), CHAT_INPUT_FILL, thickness)
+    for offset in (28, 60, 92):
+        cv2.circle(image, (x + width - round(offset * scale), center_y), round(9 * scale), CHAT_INPUT_TEXT, 1,
+                   cv2.LINE_AA)
+    if text:
+        cv2.putText(image, text, (x + round(56 * scale), center_y + round(5 * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5 * scale, CHAT_INPUT_TEXT, 1, cv2.LINE_AA)
+    return (x, y, width, height)
+
+def default_chat_input_template(margin=4):
+    """Grayscale crop of the left end of a drawn message box (with its surroundings) for matching"""
+    canvas = np.full((44 + 2 * margin, 200, 3), CHAT_BACKGROUND, dtype=np.uint8)
+    draw_chat_input(canvas, margin, margin, 180, text=None)
+    return cv2.cvtColor(canvas[:, :margin + 64], cv2.COLOR_RGB2GRAY)
+
+def synthetic_desktop(size=(1080, 3840), seed=0):
+    """Render a fake two-monitor desktop of Discord-like windows at several zoom levels
+
+    Returns the RGB image and the true chat regions, for testing region detection offline.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = size
+    image = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)  # Noisy wallpaper
+    windows = [(40, 60, 900, 480, 1.0), (980, 60, 860, 480, 1.25), (40, 580, 900, 460, 0.9),
+               (1960, 40, 1800, 700, 1.0), (1960, 780, 1200, 280, 1.1)]
+    regions = []
+    for x, y, w, h, scale in windows:
+        image[y:y + h, x:x + w] = CHAT_BACKGROUND
+        for row in range(y + 20, y + h - round(80 * scale), round(22 * scale)):  # Chat history
+            cv2.putText(image, "user: $w " + "x" * int(rng.integers(5, 40)), (x + 20, row),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45 * scale, (219, 222, 225), 1, cv2.LINE_AA)
+        margin = round(16 * scale)
+        regions.append(draw_chat_input(image, x + margin, y + h - margin - round(44 * scale), w - 2 * margin, scale))
+    return image, regions
+
+def regions_overlap(a, b):
+    """Whether two (x, y, w, h) regions intersect"""
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+class ChatRegionDetector:
+    """Finds Discord message boxes on a desktop screenshot with multi-scale template matching on an image pyramid
+
+    Templates are crops of the left end of a message box (the "+" button) placed in
+    mudae_templates/chat_input; without any, a drawn dark-theme box is used.
+    """
+    def __init__(self, template_dir=os.path.join("mudae_templates", "chat_input"),
+                 scales=(0.8, 0.9, 1.0, 1.1, 1.25, 1.5), threshold=0.8, pyramid_levels=1, margin=4):
+        self.template_dir = template_dir
+        self.scales = scales  # Discord zoom levels to look for
+        self.threshold = threshold  # Minimum normalized correlation at full resolution
+        self.pyramid_levels = pyramid_levels  # Halvings of the desktop for the coarse search
+        self.margin = margin  # Pixels of surroundings around the box in each template
+        self.templates = self.load_templates()
+        self.scaled = {}  # (template name, factor) -> resized template, reused between detections
+       
+    def load_templates(self):
+        return load_template_images(self.template_dir) or [("builtin", default_chat_input_template(self.margin))]
+   
+    def template(self, name, image, factor):
+        key = (name, round(factor, 4))
+        scaled = self.scaled.get(key)
+        if scaled is None:
+            size = (max(1, round(image.shape[1] * factor)), max(1, round(image.shape[0] * factor)))
+            scaled = self.scaled[key] = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return scaled
+   
+    @staticmethod
+    def peaks(result, threshold, shape, limit=64):
+        """Best-scoring locations of a match result, suppressing neighbours of each one found"""
+        result = result.copy()
+        half_height, half_width = shape[0] // 2, shape[1] // 2
+        found = []
+        while len(found) < limit:
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            if score < threshold:
+                break
+            found.append((score, x, y))
+            result[max(0, y - half_height):y + half_height + 1, max(0, x - half_width):x + half_width + 1] = -1
+        return found
+   
+    def detect(self, frame):
+        """Return a proposed (x, y, w, h) chat region for every message box in an RGB screenshot"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        coarse = gray
+        for _ in range(self.pyramid_levels):
+            coarse = cv2.pyrDown(coarse)
+        factor = 2 ** self.pyramid_levels
+       
+        # Coarse pass over the downsampled desktop at every zoom level
+        candidates = []
+        for name, image in self.templates:
+            for scale in self.scales:
+                small = self.template(name, image, scale / factor)
+                if min(small.shape) < 8 or small.shape[0] > coarse.shape[0] or small.shape[1] > coarse.shape[1]:
+                    continue
+                result = cv2.matchTemplate(coarse, small, cv2.TM_CCOEFF_NORMED)
+                for score, x, y in self.peaks(result, self.threshold - 0.15, small.shape):
+                    candidates.append((score, x * factor, y * factor, name, image, scale))
+                   
+        # Refine the best candidates at full resolution; the first hit on each box wins
+        boxes = []
+        for _, x, y, name, image, scale in sorted(candidates, key=lambda candidate: -candidate[0]):
+            full = self.template(name, image, scale)
+            height, width = full.shape
+            left, top = max(0, x - 2 * factor), max(0, y - 2 * factor)
+            window = gray[top:y + height + 2 * factor, left:x + width + 2 * factor]
+            if window.shape[0] < height or window.shape[1] < width:
+                continue
+            _, score, _, (dx, dy) = cv2.minMaxLoc(cv2.matchTemplate(window, full, cv2.TM_CCOEFF_NORMED))
+            box = (left + dx, top + dy, width, height)
+            if score >= self.threshold and not any(regions_overlap(box, other) for other, _ in boxes):
+                boxes.append((box, scale))
+               
+        regions = [self.extend(frame, box, scale) for box, scale in boxes]
+        return sorted(region for region in regions if region)
+   
+    def extend(self, frame, box, scale, tolerance=6):
+        """Grow a matched left end into the whole message box by following its fill colour to the right"""
+        x, y, width, height = box
+        margin = round(self.margin * scale)
+        inner_height = height - 2 * margin
+        row = y + margin + max(2, inner_height // 6)  # Above the icons and text, below the rounded corner
+        start = x + width - margin
+        if row >= frame.shape[0] or start >= frame.shape[1]:
+            return None
+        pixels = frame[row, start:].astype(np.int16)
+        outside = np.flatnonzero(np.abs(pixels - pixels[0]).max(axis=1) > tolerance)
+        end = start + (outside[0] if outside.size else pixels.shape[0])
+        if end - (x + margin) < 100 * scale:  # Too short to be a message box
+            return None
+        return (int(x + margin), int(y + margin), int(end - x - margin), int(inner_height))
+
+class VerificationPool:
+    """Runs reply verification off the input path; frames reach worker processes through shared memory"""
+    def __init__(self, use_processes=False, workers=2, max_pending=64):
+        self.use_processes = use_processes
+        self.threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify")
+        self.processes = None
+        if use_processes:
+            # Never fork a process that already runs Tk and several threads
+            self.processes = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.max_pending = max_pending  # Jobs waiting or running before new ones are turned away
+        self.pending = 0
+        self.delayed = []  # Heap of (due, seq, fn, args) not handed to a worker yet
+        self.delayed_ids = itertools.count()
+        self.cond = threading.Condition()
+        self.timer_thread = None
+        self.closed = False
+        self.shared_frames = {}  # Key (instance name) -> SharedMemory reused for its frames
+        self.shared_frames_lock = threading.Lock()
+        atexit.register(self.close)
+       
+    def submit_after(self, delay, fn, *args):
+        """Run a capture+analysis job on a verification thread once delay seconds have passed
+
+        No worker is tied up during the delay. Returns False, running nothing, once the pool is closed
+        or max_pending jobs are already waiting.
+        """
+        with self.cond:
+            if self.closed or self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+            heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.delayed_ids), fn, args))
+            if self.timer_thread is None:
+                self.timer_thread = threading.Thread(target=self.release_due, name="verify-timer", daemon=True)
+                self.timer_thread.start()
+            self.cond.notify()
+        return True
+   
+    def release_due(self):
+        """Hand delayed jobs to the worker threads as they come due"""
+        with self.cond:
+            while not self.closed:
+                if not self.delayed:
+                    self.cond.wait()
+                    continue
+                delay = self.delayed[0][0] - time.monotonic()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                _, _, fn, args = heapq.heappop(self.delayed)
+                self.threads.submit(self.run_job, fn, args)
+               
+    def run_job(self, fn, args):
+        try:
+            fn(*args)
+        finally:
+            with self.cond:
+                self.pending -= 1
+   
+    def analyze(self, key, frame, mode):
+        """Analyze a frame in-thread, or in a worker process via the key's shared memory block"""
+        if self.processes is None:
+            return analyze_reply_frame(frame, mode)
+       
+        shm = self.shared_frame(key, frame.nbytes)
+        np.copyto(np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf), frame)
+        return self.processes.submit(analyze_shared_frame, shm.name, frame.shape, mode).result()
+   
+    def shared_frame(self, key, nbytes):
+        with self.shared_frames_lock:
+            shm = self.shared_frames.get(key)
+            if shm is None or shm.size < nbytes:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+                shm = shared_memory.SharedMemory(create=True, size=nbytes)
+                self.shared_frames[key] = shm
+            return shm
+       
+    def close(self):
+        """Drop jobs not started yet, wait for the running ones, then free every shared memory block"""
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.delayed.clear()
+            self.cond.notify_all()
+        # Running jobs may still read their shared memory, so it is only unlinked once they are done
+        self.threads.shutdown(wait=True, cancel_futures=True)
+        if self.processes is not None:
+            self.processes.shutdown(wait=True, cancel_futures=True)
+        with self.shared_frames_lock:
+            for shm in self.shared_frames.values():
+                shm.close()
+                shm.unlink()
+            self.shared_frames.clear()
+
+class InputBackend(abc.ABC):
+    """Mouse/keyboard device used to deliver commands to a chat box"""
+    name = "base"
+   
+    def screen_size(self):
+        return pyautogui.size()
+   
+    def click(self, x, y):
+        pyautogui.click(x, y)
+       
+    @abc.abstractmethod
+    def type_text(self, text):
+        """Type a command into the focused chat box"""
+       
+    def press(self, key):
+        pyautogui.press(key)
+
+class TypewriteInput(InputBackend):
+    """Types one key at a time with pyautogui.typewrite (slowest, most compatible)"""
+    name = "typewrite"
+   
+    def type_text(self, text):
+        pyautogui.typewrite(text)
+
+class ClipboardInput(InputBackend):
+    """Pastes the command from the clipboard; needs pyperclip, otherwise falls back to typing"""
+    name = "clipboard"
+   
+    def __init__(self):
+        try:
+            import pyperclip  # Requires pip install pyperclip
+            self.pyperclip = pyperclip
+        except ImportError:
+            self.pyperclip = None
+           
+    def type_text(self, text):
+        if self.pyperclip is None:
+            pyautogui.typewrite(text)
+            return
+        self.pyperclip.copy(text)
+        pyautogui.hotkey('command' if sys.platform == 'darwin' else 'ctrl', 'v', _pause=False)
+
+class RecordingInput(InputBackend):
+    """Fake device that records events with timestamps instead of touching the desktop"""
+    name = "recording"
+   
+    def __init__(self, clock=time.perf_counter, size=(1920, 1080), max_events=10000):
+        self.clock = clock
+        self.size = size
+        self.events = collections.deque(maxlen=max_events)  # Latest (timestamp, action, argument)
+       
+    def screen_size(self):
+        return self.size
+   
+    def click(self, x, y):
+        self.events.append((self.clock(), 'click', (x, y)))
+       
+    def type_text(self, text):
+        self.events.append((self.clock(), 'type', text))
+       
+    def press(self, key):
+        self.events.append((self.clock(), 'press', key))
+
+INPUT_BACKENDS = {
+    'typewrite': TypewriteInput,
+    'clipboard': ClipboardInput,
+    'recording': RecordingInput,
+}
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations in seconds"""
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+   
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)  # Last slot counts values above every bucket
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+       
+    def observe(self, seconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+           
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        with self.lock:
+            if not self.count:
+                return 0.0
+            target = fraction * self.count
+            seen = 0
+            for bound, count in zip(self.BUCKETS, self.counts):
+                seen += count
+                if seen >= target:
+                    return min(bound, self.max)
+            return self.max
+       
+    @classmethod
+    def merged(cls, histograms):
+        """Combine several histograms into a new one"""
+        merged = cls()
+        for histogram in histograms:
+            with histogram.lock:
+                merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                merged.count += histogram.count
+                merged.total += histogram.total
+                merged.max = max(merged.max, histogram.max)
+        return merged
+   
+    def state(self):
+        """Consistent copy of (bucket counts, count, total, max)"""
+        with self.lock:
+            return list(self.counts), self.count, self.total, self.max
+       
+    def snapshot(self):
+        _, count, total, maximum = self.state()
+        return {
+            'count': count,
+            'sum': round(total, 6),
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': round(maximum, 6),
         }
+
+class MetricsRegistry:
+    """In-process per-instance counters and latency histograms, exportable for Prometheus or as JSON"""
+    COUNTERS = {
+        'commands_sent': "Commands typed into the chat box",
+        'commands_failed': "Commands given up on after every retry",
+        'retries': "Extra send attempts after an error",
+        'verify_passed': "Commands whose Mudae reply was found",
+        'verify_failed': "Commands whose Mudae reply was not found",
+        'quarantines': "Times the instance was quarantined after repeated failures",
+    }
+    HISTOGRAMS = {
+        'dispatch_lateness_seconds': "Time from a command's scheduled due time to its dispatch",
+        'send_latency_seconds': "End-to-end time to send a command, including retries",
+        'verify_queue_seconds': "Time a due verification waited for a free verification worker",
+        'lock_hold_seconds': "Time the input lock was held",
+    }
+   
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(int)  # (metric, instance name) -> count
+        self.histograms = {}  # (metric, instance name) -> LatencyHistogram
+        self.export_lock = threading.Lock()  # Serializes starting and stopping the exporter
+        self.export_stop = None  # Stop event of the running exporter thread
+        self.export_thread = None
+       
+    def inc(self, metric, instance_name, amount=1):
+        with self.lock:
+            self.counters[metric, instance_name] += amount
+           
+    def observe(self, metric, instance_name, seconds):
+        with self.lock:
+            histogram = self.histograms.get((metric, instance_name))
+            if histogram is None:
+                histogram = self.histograms[metric, instance_name] = LatencyHistogram()
+        histogram.observe(seconds)
+       
+    def counter(self, metric, instance_name):
+        return self.counters.get((metric, instance_name), 0)
+   
+    def histogram(self, metric, instance_name):
+        return self.histograms.get((metric, instance_name))
+   
+    def instance_names(self):
+        with self.lock:
+            keys = list(self.counters) + list(self.histograms)
+        return sorted({instance_name for _, instance_name in keys})
+   
+    def snapshot(self):
+        """JSON-friendly view: {instance: {counter: value, histogram: {count, sum, p50, ...}}}"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        data = collections.defaultdict(dict)
+        for (metric, instance_name), value in counters.items():
+            data[instance_name][metric] = value
+        for (metric, instance_name), histogram in histograms.items():
+            data[instance_name][metric] = histogram.snapshot()
+        return {'time': time.time(), 'instances': dict(data)}
+   
+    def to_prometheus(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        lines = []
+        for metric, help_text in self.COUNTERS.items():
+            lines += [f"# HELP mudae_{metric}_total {help_text}", f"# TYPE mudae_{metric}_total counter"]
+            for (name, instance_name), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f'mudae_{metric}_total{{instance="{prometheus_label(instance_name)}"}} {value}')
+        for metric, help_text in self.HISTOGRAMS.items():
+            lines += [f"# HELP mudae_{metric} {help_text}", f"# TYPE mudae_{metric} histogram"]
+            for (name, instance_name), histogram in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                label = f'instance="{prometheus_label(instance_name)}"'
+                counts, count, total, _ = histogram.state()
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.BUCKETS, counts):
+                    cumulative += bucket_count
+                    lines.append(f'mudae_{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'mudae_{metric}_bucket{{{label},le="+Inf"}} {count}')
+                lines.append(f'mudae_{metric}_sum{{{label}}} {total}')
+                lines.append(f'mudae_{metric}_count{{{label}}} {count}')
+        return "\n".join(lines) + "\n"
+   
+    def export(self, path, fmt="prometheus"):
+        """Atomically write a Prometheus textfile or a JSON snapshot"""
+        if fmt == "json":
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.to_prometheus()
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+       
+    def start_periodic_export(self, path, fmt="prometheus", interval=15):
+        """Export every interval seconds on a background thread until stop_periodic_export()
+
+        A running exporter is stopped first, so there is never more than one writing.
+        """
+        with self.export_lock:
+            self.stop_exporter()
+            stop = self.export_stop = threading.Event()
+           
+            def run():
+                while not stop.wait(interval):
+                    try:
+                        self.export(path, fmt)
+                    except Exception as e:
+                        print(f"Error exporting metrics: {e}")
+                       
+            self.export_thread = threading.Thread(target=run, name="metrics-export", daemon=True)
+            self.export_thread.start()
+           
+    def stop_periodic_export(self):
+        with self.export_lock:
+            self.stop_exporter()
+           
+    def stop_exporter(self):
+        """Stop the exporter thread and wait for a write in progress (call with export_lock held)"""
+        if self.export_thread is not None:
+            self.export_stop.set()
+            self.export_thread.join()
+            self.export_thread = None
+
+def prometheus_label(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class NullSpan:
+    """Span handed out while tracing is off: entering and leaving it does nothing"""
+    __slots__ = ()
+   
+    def __enter__(self):
+        return self
+   
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class TraceSpan:
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+   
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+       
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+   
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.category, self.start, time.perf_counter(), self.args)
+        return False
+
+class Tracer:
+    """Bounded ring buffer of timed spans, exported as Chrome trace events (chrome://tracing or ui.perfetto.dev)"""
+    def __init__(self, capacity=100000):
+        self.enabled = False
+        self.spans = collections.deque(maxlen=capacity)  # (name, category, start, end, thread id, args)
+        self.thread_names = {}
+        self.epoch = time.perf_counter()
+       
+    def span(self, name, category="send", **args):
+        """Time a block with 'with'; a shared no-op object while tracing is off"""
+        if not self.enabled:
+            return NULL_SPAN
+        return TraceSpan(self, name, category, args)
+   
+    def record(self, name, category, start, end, args=None):
+        """Add a span measured with time.perf_counter()"""
+        thread = threading.current_thread()
+        self.thread_names.setdefault(thread.ident, thread.name)
+        self.spans.append((name, category, start, end, thread.ident, args))
+       
+    def clear(self):
+        self.spans.clear()
+       
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in list(self.thread_names.items())]
+        for name, category, start, end, tid, args in list(self.spans):
+            events.append({
+                'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': round((start - self.epoch) * 1e6, 1), 'dur': round((end - start) * 1e6, 1),
+                'args': args or {},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+   
+    def export(self, path):
+        """Atomically write the buffered spans as a Chrome trace JSON file"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+        os.replace(temp_path, path)
+        return len(self.spans)
+
+class SystemClock:
+    """Real time"""
+    realtime = True
+   
+    def monotonic(self):
+        return time.monotonic()
+   
+    def time(self):
+        return time.time()
+   
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class VirtualClock:
+    """Simulated time for benchmarks: sleeping advances the clock instantly"""
+    realtime = False
+   
+    def __init__(self, start=1000.0):
+        self.now = start
+        self.wall_offset = time.time() - start
+       
+    def monotonic(self):
+        return self.now
+   
+    def time(self):
+        return self.now + self.wall_offset
+   
+    def sleep(self, seconds):
+        self.now += max(0, seconds)
+       
+    def advance_to(self, when):
+        self.now = max(self.now, when)
+
+class CommandScheduler:
+    """Earliest-deadline-first queue of the commands due for every instance
+
+    Entries sit in one global heap and in a heap per instance, so coalescing an instance's due
+    commands never scans the others. Removed entries are only flagged and dropped lazily.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []  # [due, seq, instance_name, command, alive] entries
+        self._by_instance = {}  # Instance name -> heap of its entries (the same lists)
+        self._tokens = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def _push(self, instance_name, command, due):
+        entry = [due, next(self._counter), instance_name, command, True]
+        heapq.heappush(self._heap, entry)
+        heapq.heappush(self._by_instance.setdefault(instance_name, []), entry)
+
+    def _drop(self, instance_name):
+        for entry in self._by_instance.pop(instance_name, ()):
+            entry[4] = False
+
+    def _earliest(self, heap):
+        """Discard removed entries from the top of a heap; return the earliest live one or None"""
+        while heap and not heap[0][4]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _take(self, entry):
+        entry[4] = False
+        instance_heap = self._by_instance.get(entry[2])
+        if instance_heap is not None and self._earliest(instance_heap) is None:
+            del self._by_instance[entry[2]]
+        return entry[0], entry[2], entry[3]
+
+    def schedule(self, instance_name, command, due, generation=None):
+        """Queue a command for an instance at a monotonic deadline; returns whether it was queued
+
+        Given a generation(), nothing is queued if the instance's queue was cancelled or replaced since.
+        """
+        with self._cond:
+            if generation is not None and generation != self._tokens.get(instance_name, 0):
+                return False
+            self._push(instance_name, command, due)
+            self._cond.notify()
+            return True
+
+    def cancel(self, instance_name):
+        """Drop every pending command of an instance"""
+        with self._cond:
+            self._tokens[instance_name] = self._tokens.get(instance_name, 0) + 1
+            self._drop(instance_name)
+            self._cond.notify()
+           
+    def replace(self, instance_name, entries):
+        """Atomically drop every pending command of an instance and queue (command, due) entries instead"""
+        with self._cond:
+            self._tokens[instance_name] = self._tokens.get(instance_name, 0) + 1
+            self._drop(instance_name)
+            for command, due in entries:
+                self._push(instance_name, command, due)
+            self._cond.notify()
+           
+    def generation(self, instance_name):
+        """Token of an instance's current queue; cancel() and replace() move it on"""
+        with self._cond:
+            return self._tokens.get(instance_name, 0)
+
+    def pop_until(self, deadline):
+        """Pop the earliest command if it is due by a deadline, without waiting; None otherwise"""
+        with self._cond:
+            entry = self._earliest(self._heap)
+            if entry is None or entry[0] > deadline:
+                return None
+            heapq.heappop(self._heap)
+            return self._take(entry)
+       
+    def take_due(self, instance_name, deadline):
+        """Remove and return the (due, command) entries of one instance due by a deadline, earliest first"""
+        with self._cond:
+            heap = self._by_instance.get(instance_name, [])
+            taken = []
+            while True:
+                entry = self._earliest(heap)
+                if entry is None or entry[0] > deadline:
+                    break
+                heapq.heappop(heap)
+                entry[4] = False  # The global heap drops it when it surfaces
+                taken.append((entry[0], entry[3]))
+            if not heap:
+                self._by_instance.pop(instance_name, None)
+            return taken
+       
+    def next_due(self):
+        """Block until the earliest deadline passes and return (due, instance_name, command)"""
+        with self._cond:
+            while True:
+                entry = self._earliest(self._heap)
+                if entry is None:
+                    self._cond.wait()
+                    continue
+                   
+                delay = entry[0] - self.clock()
+                if delay <= 0:
+                    heapq.heappop(self._heap)
+                    return self._take(entry)
+                self._cond.wait(delay)
+
+class ScheduleStateStore:
+    """Debounced, atomic persistence of every instance's last send times (kept apart from the config)"""
+    def __init__(self, path="mudae_state.json", clock=None, debounce=2.0):
+        self.path = path
+        self.clock = clock or SystemClock()
+        self.debounce = debounce  # Seconds to coalesce updates before writing
+        self.records = {}  # Instance name -> {command: wall-clock time it was last sent}
+        self.lock = threading.Lock()
+        self.timer = None
+        atexit.register(self.flush)
+       
+    def load(self):
+        """Read the state file; a missing or corrupt file just means no history"""
+        try:
+            with open(self.path, 'r') as f:
+                self.records = json.load(f)
+        except (OSError, ValueError):
+            self.records = {}
+           
+    def restore(self, instance):
+        """Convert saved wall-clock send times back to this process's monotonic clock"""
+        now_monotonic, now_wall = self.clock.monotonic(), self.clock.time()
+        for command, sent_wall in self.records.get(instance.name, {}).items():
+            # A wall clock that jumped backwards must not push the next command into the future
+            elapsed = max(0, now_wall - sent_wall)
+            instance.mark_sent(command, now_monotonic - elapsed)
+           
+    def record(self, instance, command):
+        """Remember that an instance just sent a command"""
+        sent_wall = self.clock.time() - (self.clock.monotonic() - instance.last_sent(command))
+        self.update(instance.name, command, sent_wall)
+       
+    def update(self, instance_name, command, sent_wall):
+        """Store a wall-clock send time and schedule a write"""
+        with self.lock:
+            self.records.setdefault(instance_name, {})[command] = round(sent_wall, 3)
+            self.schedule_flush()
+           
+    def forget(self, instance_name):
+        with self.lock:
+            if self.records.pop(instance_name, None) is not None:
+                self.schedule_flush()
+               
+    def clear(self):
+        with self.lock:
+            self.records = {}
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+           
+    def schedule_flush(self):
+        if self.timer is None:
+            self.timer = threading.Timer(self.debounce, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+           
+    def flush(self):
+        """Write the state atomically: temp file, fsync, rename"""
+        with self.lock:
+            if self.timer is None:
+                return  # Nothing changed since the last write
+            self.timer.cancel()
+            self.timer = None
+            data = json.dumps(self.records, indent=2)
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error saving schedule state: {e}")
+
+class LogWriter:
+    """Background log sink that batches queued records into a rotating file"""
+    def __init__(self, path="mudae_log.txt", max_bytes=5 * 1024 * 1024, rotate_interval=0,
+                 backup_count=3, structured=False, flush_interval=0.5, max_pending=10000):
+        self.base_path = path
+        self.max_bytes = max_bytes  # Rotate when the file would grow past this size (0 = never)
+        self.rotate_interval = rotate_interval  # Rotate after this many seconds (0 = never)
+        self.backup_count = backup_count
+        self.structured = structured  # Write JSON lines to a .jsonl file instead of plain text
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()  # Only taken when the queue is full
+       
+        # deque.append/popleft are atomic, so callers never take a lock to log
+        self._pending = collections.deque(maxlen=max_pending)
+        self._batch_size = max(1, max_pending // 4)
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._file = None
+        self._file_path = None
+        self._opened_at = 0
+       
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+       
+    @property
+    def path(self):
+        if self.structured:
+            return os.path.splitext(self.base_path)[0] + ".jsonl"
+        return self.base_path
+       
+    def write(self, message, level="INFO", instance=None):
+        """Queue a log record; O(1) and safe to call from any thread"""
+        if len(self._pending) == self._pending.maxlen:
+            with self._dropped_lock:
+                self.dropped += 1  # Oldest record is discarded by the bounded deque
+        self._pending.append((time.time(), message, level, instance))
+        if len(self._pending) >= self._batch_size:
+            self._wakeup.set()
+           
+    def close(self):
+        """Flush pending records and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        if self._file:
+            self._file.close()
+            self._file = None
+           
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush()
+        self._flush()
+       
+    def _flush(self):
+        records = []
+        while self._pending:
+            records.append(self._pending.popleft())
+        if not records:
+            return
+           
+        try:
+            data = "".join(self._format(*record) for record in records)
+            self._open_for(len(data))
+            self._file.write(data)
+            self._file.flush()
+        except Exception as e:
+            print(f"Error saving log: {e}")
+           
+    def _format(self, created, message, level, instance):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+        if self.structured:
+            return json.dumps({'time': timestamp, 'epoch': round(created, 3), 'level': level, 'instance': instance,
+                               'message': message}) + "\n"
+        return f"[{timestamp}] {message}\n"
+   
+    def _open_for(self, incoming_bytes):
+        """Make sure the right file is open, rotating it first if needed"""
+        path = self.path
+        if self._file and self._file_path != path:
+            self._file.close()
+            self._file = None
+           
+        if not self._file:
+            self._file = open(path, "a", encoding="utf-8")
+            self._file_path = path
+            self._opened_at = time.time()
+           
+        size = self._file.tell()
+        too_big = self.max_bytes and size and size + incoming_bytes > self.max_bytes
+        too_old = self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+        if too_big or (too_old and size):
+            self._file.close()
+            self._rotate(path)
+            self._file = open(path, "a", encoding="utf-8")
+            self._opened_at = time.time()
+           
+    def _rotate(self, path):
+        """Shift path -> path.1 -> path.2 ... dropping the oldest backup"""
+        if self.backup_count <= 0:
+            os.remove(path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{path}.{index + 1}")
+        os.replace(path, f"{path}.1")
+
+class LogModel:
+    """Capped ring buffer of log lines, indexed by instance and level for fast filtering"""
+    LEVELS = ("INFO", "WARNING", "ERROR")
+   
+    def __init__(self, capacity=20000):
+        self.capacity = capacity
+        self.slots = [None] * capacity  # seq % capacity -> (timestamp, instance, level, message, lowered)
+        self.first_seq = 0  # Oldest line still held
+        self.next_seq = 0
+        self.by_instance = collections.defaultdict(collections.deque)  # Instance -> seqs, oldest first
+        self.by_level = collections.defaultdict(collections.deque)
+       
+    def __len__(self):
+        return self.next_seq - self.first_seq
+   
+    def append(self, timestamp, message, level="INFO", instance=None):
+        """Add a line, evicting the oldest one when full; returns its sequence number"""
+        seq = self.next_seq
+        if len(self) == self.capacity:
+            _, old_instance, old_level, _, _ = self.slots[self.first_seq % self.capacity]
+            self.by_instance[old_instance].popleft()
+            self.by_level[old_level].popleft()
+            self.first_seq += 1
+        self.slots[seq % self.capacity] = (timestamp, instance, level, message, message.lower())
+        self.by_instance[instance].append(seq)
+        self.by_level[level].append(seq)
+        self.next_seq += 1
+        return seq
+   
+    def entry(self, seq):
+        return self.slots[seq % self.capacity]
+   
+    def line(self, seq):
+        timestamp, _, _, message, _ = self.entry(seq)
+        return f"[{timestamp}] {message}"
+   
+    def matches(self, seq, instance=None, level=None, text=""):
+        _, entry_instance, entry_level, _, lowered = self.entry(seq)
+        return ((instance is None or entry_instance == instance) and (level is None or entry_level == level)
+                and (not text or text.lower() in lowered))
+   
+    def query(self, instance=None, level=None, text=""):
+        """Sequence numbers of the held lines passing every given filter, oldest first"""
+        if instance is not None:
+            candidates = self.by_instance.get(instance, ())
+        elif level is not None:
+            candidates = self.by_level.get(level, ())
+        else:
+            candidates = range(self.first_seq, self.next_seq)
+        return [seq for seq in candidates if self.matches(seq, instance, level, text)]
+   
+    def clear(self):
+        self.slots = [None] * self.capacity
+        self.first_seq = self.next_seq
+        self.by_instance.clear()
+        self.by_level.clear()
+
+class CaptureBackend(abc.ABC):
+    """Grabs screen regions into preallocated NumPy buffers reused between frames"""
+    name = "base"
+   
+    def __init__(self):
+        self.local = threading.local()  # Per-thread state, so no two threads ever share a buffer
+        self.frames = 0
+        self.allocations = 0  # Frame-sized buffers allocated, including temporary ones
+        self.total_seconds = 0.0
+        self.stats_lock = threading.Lock()
+       
+    def buffer_for(self, region):
+        """The calling thread's reusable RGB array for a region"""
+        buffers = getattr(self.local, 'buffers', None)
+        if buffers is None:
+            buffers = self.local.buffers = {}  # (x, y, w, h) -> RGB array
+        buffer = buffers.get(region)
+        if buffer is None:
+            x, y, w, h = region
+            buffer = buffers[region] = np.empty((h, w, 3), dtype=np.uint8)
+            self.count_allocations(1)
+        return buffer
+   
+    def count_allocations(self, count):
+        with self.stats_lock:
+            self.allocations += count
+           
+    def capture(self, region, out=None):
+        """Capture a region as an RGB array
+
+        Without out, the array is this thread's reusable buffer for the region and is overwritten by its
+        next capture of that region.
+        """
+        region = tuple(region)
+        start = time.perf_counter()
+        buffer = self.buffer_for(region) if out is None else out
+        self.grab(region, buffer)
+        with self.stats_lock:
+            self.total_seconds += time.perf_counter() - start
+            self.frames += 1
+        return buffer
+   
+    @abc.abstractmethod
+    def grab(self, region, out):
+        """Copy the pixels of an (x, y, w, h) region into an RGB array of shape (h, w, 3)"""
+       
+    def virtual_screen(self):
+        """(x, y, w, h) bounds of the whole desktop; pyautogui only knows the primary monitor"""
+        return (0, 0, *pyautogui.size())
+       
+    def reset_stats(self):
+        with self.stats_lock:
+            self.frames = self.allocations = 0
+            self.total_seconds = 0.0
+           
+    def stats(self):
+        """Capture latency and allocations per frame so far"""
+        with self.stats_lock:
+            frames, allocations, total_seconds = self.frames, self.allocations, self.total_seconds
+        return {
+            'backend': self.name,
+            'frames': frames,
+            'avg_latency_ms': round(total_seconds / max(frames, 1) * 1000, 3),
+            'allocations_per_frame': round(allocations / max(frames, 1), 3),
+        }
+
+class PyAutoGUICapture(CaptureBackend):
+    """Portable backend built on pyautogui.screenshot (new PIL image per frame)"""
+    name = "pyautogui"
+   
+    def grab(self, region, out):
+        image = pyautogui.screenshot(region=region)
+        np.copyto(out, np.asarray(image.convert('RGB')))
+        self.count_allocations(2)  # PIL image plus its array copy
+
+class MSSCapture(CaptureBackend):
+    """Native backend using mss (XShmGetImage on X11, BitBlt on Windows)"""
+    name = "mss"
+   
+    def __init__(self):
+        super().__init__()
+        import mss  # Requires pip install mss
+        self.mss = mss
+       
+    def grabber(self):
+        grabber = getattr(self.local, 'grabber', None)  # mss handles must stay on the thread that created them
+        if grabber is None:
+            grabber = self.local.grabber = self.mss.mss()
+        return grabber
+   
+    def virtual_screen(self):
+        """Bounding box of every monitor; left or top is negative when a monitor sits left of or above the primary"""
+        monitor = self.grabber().monitors[0]
+        return (monitor['left'], monitor['top'], monitor['width'], monitor['height'])
+       
+    def grab(self, region, out):
+        x, y, w, h = region
+        shot = self.grabber().grab({'left': x, 'top': y, 'width': w, 'height': h})
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(h, w, 4)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=out)
+        self.count_allocations(1)  # Raw pixel bytes returned by mss
+
+class FakeCapture(CaptureBackend):
+    """In-memory backend that slices a synthetic desktop; for headless benchmarks and tests"""
+    name = "fake"
+   
+    def __init__(self, desktop=None, size=(1080, 1920), origin=(0, 0)):
+        super().__init__()
+        if desktop is None:
+            desktop = np.random.default_rng(0).integers(0, 256, (*size, 3), dtype=np.uint8)
+        self.desktop = desktop
+        self.origin = origin  # Screen coordinates of the desktop's top-left pixel
+       
+    def virtual_screen(self):
+        return (*self.origin, self.desktop.shape[1], self.desktop.shape[0])
+       
+    def grab(self, region, out):
+        x, y, w, h = region
+        x, y = x - self.origin[0], y - self.origin[1]
+        np.copyto(out, self.desktop[y:y + h, x:x + w])
+
+CAPTURE_BACKENDS = {
+    'pyautogui': PyAutoGUICapture,
+    'mss': MSSCapture,
+    'fake': FakeCapture,
+}
+
+def create_capture_backend(name):
+    """Create a capture backend by name, falling back to pyautogui if it is unavailable"""
+    try:
+        return CAPTURE_BACKENDS[name]()
+    except (KeyError, ImportError) as e:
+        print(f"Capture backend '{name}' unavailable ({e}); using pyautogui")
+        return PyAutoGUICapture()
+
+def benchmark_capture(backend, region=(0, 0, 800, 600), frames=200):
+    """Capture the same region repeatedly and return the backend's stats"""
+    backend.capture(region)  # Warm up and allocate the region buffer
+    backend.reset_stats()
+    for _ in range(frames):
+        backend.capture(region)
+    return backend.stats()
+
+def union_region(regions):
+    """Smallest (x, y, w, h) box covering every region"""
+    left = min(x for x, y, w, h in regions)
+    top = min(y for x, y, w, h in regions)
+    right = max(x + w for x, y, w, h in regions)
+    bottom = max(y + h for x, y, w, h in regions)
+    return (left, top, right - left, bottom - top)
+
+class SharedDesktopCapture:
+    """One grab of the union of all active regions per tick, handed out as zero-copy per-instance views"""
+    def __init__(self, backend, active_regions=None, max_gather=0.25):
+        self.backend = backend
+        self.active_regions = active_regions or (lambda: [])
+        self.max_gather = max_gather  # Longest a waiting instance is held back for others to join the tick
+        self.cond = threading.Condition()
+        self.pending = []  # Slots of instances waiting for the next tick
+        self.announced = 0  # Instances in their verify delay that will ask for a frame soon
+        self.readers = 0  # Views of the current frame still being analyzed
+        self.ticks = 0
+        self.views = 0
+        self.thread = None
+        self.storage = None  # Flat pixels reused by every union region, grown when a union is larger
+       
+    def announce(self):
+        """An instance is about to need a frame; the next tick waits (briefly) for it"""
+        with self.cond:
+            self.announced += 1
+           
+    def withdraw(self):
+        """An announced instance no longer needs a frame"""
+        with self.cond:
+            self.announced = max(0, self.announced - 1)
+            self.cond.notify_all()
+           
+    def acquire(self, region):
+        """Block until the next tick and return a view of the region; call release() when done with it"""
+        slot = {'region': tuple(region)}
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="shared-capture", daemon=True)
+                self.thread.start()
+            self.announced = max(0, self.announced - 1)
+            self.pending.append(slot)
+            self.cond.notify_all()
+            while 'frame' not in slot and 'error' not in slot:
+                self.cond.wait()
+        if 'error' in slot:
+            raise slot['error']
+        return slot['frame']
+   
+    def release(self):
+        with self.cond:
+            self.readers -= 1
+            self.cond.notify_all()
+           
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                   
+                # The more instances are still on their way, the longer the tick waits (up to max_gather)
+                deadline = time.monotonic() + self.max_gather
+                while self.announced and time.monotonic() < deadline:
+                    self.cond.wait(deadline - time.monotonic())
+                   
+                # Never overwrite the buffer while views of the last frame are being analyzed
+                while self.readers:
+                    self.cond.wait()
+                batch, self.pending = self.pending, []
+               
+            try:
+                regions = [slot['region'] for slot in batch]
+                left, top, width, height = union_region(regions + [tuple(r) for r in self.active_regions()])
+                frame = self.backend.capture((left, top, width, height), out=self.frame_buffer(width, height))
+                for slot in batch:
+                    x, y, w, h = slot['region']
+                    slot['frame'] = frame[y - top:y - top + h, x - left:x - left + w]
+            except Exception as e:
+                for slot in batch:
+                    slot['error'] = e
+                   
+            with self.cond:
+                self.readers += sum('frame' in slot for slot in batch)
+                self.ticks += 1
+                self.views += len(batch)
+                self.cond.notify_all()
+               
+    def frame_buffer(self, width, height):
+        """An RGB view of the reusable storage, so a union that changes as instances move leaves nothing behind"""
+        size = width * height * 3
+        if self.storage is None or self.storage.size < size:
+            self.storage = np.empty(size, dtype=np.uint8)
+            self.backend.count_allocations(1)
+        return self.storage[:size].reshape(height, width, 3)
+   
+    def stats(self):
+        """Ticks so far and how many instances each grab served on average"""
+        return {
+            'ticks': self.ticks,
+            'views': self.views,
+            'views_per_tick': round(self.views / max(self.ticks, 1), 2),
+        }
+
+class SessionRecorder:
+    """Records verification frames and the command timeline of a live session for offline replay
+
+    Frames are stored per instance in chunk files of up to CHUNK_FRAMES zlib-compressed records: a
+    keyframe at the start of a chunk (or when the region changes size), every later frame XORed with its
+    predecessor (mostly zeros for a chat box), and repeated frames not at all. Each record is written and
+    flushed before the timeline entry pointing at it, so a session cut short by a crash still replays.
+    Compressed records cannot be memory-mapped; replay reads and inflates one record per changed frame.
+    """
+    CHUNK_FRAMES = 64
+    COMPRESSION_LEVEL = 1  # XOR deltas are mostly zeros; higher levels cost capture time for little gain
+   
+    def __init__(self, directory, clock=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.clock = clock or SystemClock()
+        self.started = self.clock.monotonic()
+        self.lock = threading.Lock()
+        self.timeline = open(os.path.join(directory, "timeline.jsonl"), "a", encoding="utf-8")
+        self.chunks = {}  # Instance name -> chunk being filled: open file, frames written, last frame and record
+        self.chunk_ids = itertools.count(len([n for n in os.listdir(directory) if n.startswith("chunk-")]))
+        atexit.register(self.close)
+       
+    def event(self, kind, instance_name, **fields):
+        record = {'t': round(self.clock.monotonic() - self.started, 3), 'type': kind, 'instance': instance_name}
+        record.update(fields)
+        self.timeline.write(json.dumps(record) + "\n")
+        self.timeline.flush()
+       
+    def command(self, instance_name, command, attempts, sent):
+        """Add a send (or failed send) to the timeline"""
+        with self.lock:
+            self.event('command', instance_name, command=command, attempts=attempts, sent=sent)
+           
+    def frame(self, instance_name, frame, mode, verified):
+        """Store a verification frame with the verdict it got live"""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        with self.lock:
+            chunk = self.chunks.get(instance_name)
+            if chunk and (chunk['previous'].shape != frame.shape or chunk['frames'] >= self.CHUNK_FRAMES):
+                self.close_chunk(instance_name)
+                chunk = None
+               
+            if chunk is None:
+                name = f"chunk-{next(self.chunk_ids):05d}.bin"
+                chunk = {'name': name, 'file': open(os.path.join(self.directory, name), "wb"), 'frames': 0}
+                self.chunks[instance_name] = chunk
+                self.write_record(chunk, frame, key=True)
+            elif not np.array_equal(frame, chunk['previous']):  # A repeated picture points at the last record
+                self.write_record(chunk, np.bitwise_xor(frame, chunk['previous']), key=False)
+            chunk['previous'] = frame.copy()
+            self.event('frame', instance_name, chunk=chunk['name'], **chunk['record'],
+                       mode=mode, verified=bool(verified))
+           
+    def write_record(self, chunk, pixels, key):
+        data = zlib.compress(pixels.tobytes(), self.COMPRESSION_LEVEL)
+        offset = chunk['file'].tell()
+        chunk['file'].write(data)
+        chunk['file'].flush()
+        chunk['frames'] += 1
+        chunk['record'] = {'offset': offset, 'size': len(data), 'shape': list(pixels.shape), 'key': key}
+       
+    def close_chunk(self, instance_name):
+        self.chunks.pop(instance_name)['file'].close()
+       
+    def close(self):
+        """Close the chunk files and the timeline"""
+        with self.lock:
+            if self.timeline.closed:
+                return
+            for instance_name in list(self.chunks):
+                self.close_chunk(instance_name)
+            self.timeline.close()
+
+def iter_session_events(directory):
+    """Yield every readable timeline event of a recorded session"""
+    with open(os.path.join(directory, "timeline.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:  # The last line of a session that ended in a crash
+                continue
+
+def iter_session_frames(directory, events=None):
+    """Yield (timeline event, RGB frame) for every recorded frame, decoding each record once
+
+    Other events are passed to events(event) when given, so one read of the timeline serves both.
+    """
+    decoders = {}  # Instance name -> {chunk name, open chunk file, offset decoded, frame}
+    try:
+        for event in iter_session_events(directory):
+            if event['type'] != 'frame':
+                if events:
+                    events(event)
+                continue
+            decoder = decoders.get(event['instance'])
+            if decoder is None or decoder['chunk'] != event['chunk']:
+                if decoder:
+                    decoder['file'].close()
+                decoder = decoders[event['instance']] = {
+                    'chunk': event['chunk'], 'file': open(os.path.join(directory, event['chunk']), "rb"),
+                    'offset': None, 'frame': None,
+                }
+            if decoder['offset'] != event['offset']:
+                decoder['file'].seek(event['offset'])
+                pixels = np.frombuffer(zlib.decompress(decoder['file'].read(event['size'])), dtype=np.uint8)
+                pixels = pixels.reshape(event['shape'])
+                if event['key']:
+                    decoder['frame'] = pixels.copy()
+                else:
+                    np.bitwise_xor(decoder['frame'], pixels, out=decoder['frame'])
+                decoder['offset'] = event['offset']
+            yield event, decoder['frame']
+    finally:
+        for decoder in decoders.values():
+            decoder['file'].close()
+
+def run_replay(directory, mode=None):
+    """Feed a recorded session through the verifier at full speed; report agreement with the live verdicts and fps"""
+    frames = agreed = 0
+    analysis_seconds = 0.0
+    disagreements = collections.Counter()
+    other_events = collections.Counter()  # Event type -> count, for everything but frames
+    for event, frame in iter_session_frames(directory, lambda event: other_events.update([event['type']])):
+        start = time.perf_counter()
+        verified = analyze_reply_frame(frame, mode or event['mode'])
+        analysis_seconds += time.perf_counter() - start
+        frames += 1
+        if verified == event['verified']:
+            agreed += 1
+        else:
+            disagreements[event['instance']] += 1
+           
+    return {
+        'frames': frames,
+        'commands': other_events['command'],
+        'accuracy': round(agreed / frames, 4) if frames else None,
+        'frames_per_sec': round(frames / analysis_seconds, 1) if analysis_seconds else None,
+        'disagreements': dict(disagreements),
+    }
+
+class AutomationEngine:
+    """Scheduling, input and verification core shared by the GUI and the benchmarks"""
+    def __init__(self, clock=None, input_backend=None, log_file="mudae_log.txt", echo_log=True, seed=None,
+                 state_file="mudae_state.json"):
+        self.clock = clock or SystemClock()
+        self.instances = {}
+        self.state_store = ScheduleStateStore(state_file, self.clock) if state_file else None
+        self.log_writer = LogWriter(log_file) if log_file else None
+        self.echo_log = echo_log  # Print log lines to the console
+        self.scheduler = CommandScheduler(clock=self.clock.monotonic)
+        self.dispatcher_thread = None
+        self.config_file = "mudae_instances.json"
+        self.pyautogui_lock = threading.Lock() 
+        self.metrics = MetricsRegistry()
+        self.tracer = Tracer()  # Off until enabled; spans then cover the whole send path
+        self.input_backend = input_backend or TypewriteInput()
+        self.random = random.Random(seed)
+        self.retry_attempts = 3  # New: Default retry attempts
+        self.command_delay = 0.2  # New: Default command delay (seconds)
+        self.start_stagger = 2.0  # Seconds between first commands of instances on Start All
+        self.failed_command_delay = 5  # Seconds before a failed command is tried again
+        self.retry_backoff = 0.5  # Wait before the first retry; doubles for every further attempt
+        self.coalesce_window = 2.0  # Commands of one instance due within this many seconds share one focus click
+        self.capture_backend = PyAutoGUICapture()
+        self.shared_capture = None  # SharedDesktopCapture when one grab per tick serves every instance
+        self.recorder = None  # SessionRecorder when frames and commands are recorded for replay
+        self.verify_enabled = False  # Check the chat region for a Mudae reply after each command
+        self.verify_delay = 1.5  # Seconds to wait for Mudae's reply before capturing
+        self.region_detector = None  # ChatRegionDetector, created on first use
+        self.warned_no_templates = False
+        self.verification_pool = VerificationPool()
+        self.control_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mudae-control")
+       
+    def validate_region(self, region):
+        """Validate if region is within the screen the input device can click on (the primary one for pyautogui)"""
+        try:
+            screen_width, screen_height = self.input_backend.screen_size()
+            x, y, w, h = region
+            center_x = x + w // 2
+            center_y = y + h // 2
+            if 0 <= center_x < screen_width and 0 <= center_y < screen_height:
+                return True
+            return False
+        except Exception as e:
+            self.log_message(f"Error validating region: {e}", level="ERROR")
+            return False
+       
+    def send_command_to_instance(self, instance, command):
+        """Make one attempt at sending a command to a specific instance; True if it went out"""
+        return bool(self.send_commands_to_instance(instance, [command]))
+   
+    def send_commands_to_instance(self, instance, commands, attempt=1):
+        """Make one attempt at sending commands back-to-back after one focus click; returns the commands that went out
+
+        Retries are up to the caller: the dispatcher queues them on the scheduler instead of waiting.
+        """
+        if attempt > 1:
+            self.metrics.inc('retries', instance.name)
+        with self.tracer.span("validate region", instance=instance.name):
+            valid = self.validate_region(instance.chat_region)
+        if not valid:
+            self.log_message("Invalid chat region", level="ERROR", instance=instance.name)
+            return []
+           
+        sent = []
+        try:
+            self.type_commands(instance, commands, sent)
+        except Exception as e:
+            self.log_message(f"Error sending command {', '.join(commands[len(sent):])} "
+                             f"(attempt {attempt}): {e}", level="ERROR", instance=instance.name)
+        if not sent:
+            return sent
+        self.log_message(f"Sent command: {', '.join(sent)} (attempt {attempt})", instance=instance.name)
+        self.metrics.inc('commands_sent', instance.name, len(sent))
+        if self.recorder:
+            for command in sent:
+                self.recorder.command(instance.name, command, attempt, True)
+               
+        # Optional: Verify command success on a worker once Mudae had time to reply, outside the input lock
+        if self.verify_enabled and len(sent) == len(commands):
+            self.schedule_verification(instance, commands)
+        return sent
+   
+    def give_up(self, instance, commands, attempts):
+        """Report commands that failed on every attempt"""
+        self.log_message(f"Failed to send command {', '.join(commands)} after {attempts} attempts", level="ERROR",
+                         instance=instance.name)
+        self.metrics.inc('commands_failed', instance.name, len(commands))
+        if self.recorder:
+            for command in commands:
+                self.recorder.command(instance.name, command, attempts, False)
+   
+    def type_commands(self, instance, commands, typed):
+        """Click the instance's chat box once, then type each command and press enter, under the input lock"""
+        center_x = instance.chat_region[0] + instance.chat_region[2] // 2
+        center_y = instance.chat_region[1] + instance.chat_region[3] // 2
+       
+        trace = self.tracer.span
+        wait_started = time.perf_counter()
+        with self.pyautogui_lock:  # Lock to prevent concurrent PyAutoGUI usage
+            acquired = self.clock.monotonic()
+            if self.tracer.enabled:
+                self.tracer.record("lock wait", "input", wait_started, time.perf_counter(), {'instance': instance.name})
+            try:
+                with trace("click", "input", instance=instance.name):
+                    self.input_backend.click(center_x, center_y)
+                for command in commands:
+                    with trace("command delay", "input", instance=instance.name):
+                        self.clock.sleep(self.command_delay)  # Let the chat box take focus (or settle) before typing
+                    with trace("typewrite", "input", instance=instance.name, command=command):
+                        self.input_backend.type_text(command)
+                    with trace("command delay", "input", instance=instance.name):
+                        self.clock.sleep(self.command_delay)
+                    with trace("enter", "input", instance=instance.name):
+                        self.input_backend.press('enter')
+                    typed.append(command)  # Retries resume after the commands already sent
+            finally:
+                self.metrics.observe('lock_hold_seconds', instance.name, self.clock.monotonic() - acquired)
+               
+    def schedule_verification(self, instance, commands):
+        """Check the instance's chat region for replies to commands sent together once verify_delay seconds have passed"""
+        shared = self.shared_capture
+        if shared:
+            shared.announce()  # The shared grab waits (briefly) for this frame
+        due = time.monotonic() + self.verify_delay
+        if not self.verification_pool.submit_after(self.verify_delay, self.verify_command, instance, list(commands),
+                                                   shared, due):
+            if shared:
+                shared.withdraw()
+            self.log_message(f"Verification backlog full; not verifying {', '.join(commands)}", level="WARNING",
+                             instance=instance.name)
+            self.record_outcome(instance, True)  # No verdict is coming, and the command did go out
+           
+    def verify_command(self, instance, commands, shared=None, due=None):
+        """Verify if commands sent together were successful by capturing and analyzing the chat region once
+
+        Runs on a verification worker. The chat region shows the replies to the whole batch, so the
+        verdict covers every command in it.
+        """
+        command = ', '.join(commands)
+        if due is not None:  # Verification workers are the one shared resource that can fall behind
+            self.metrics.observe('verify_queue_seconds', instance.name, max(0.0, time.monotonic() - due))
+        try:
+            if not instance.running:
+                if shared:
+                    shared.withdraw()
+                return None  # Instance stopped meanwhile; nothing to verify
+           
+            # One verification per instance at a time: the capture buffer and shared frame are reused
+            with instance.verify_lock, self.tracer.span("verify", "verify", instance=instance.name, command=command):
+                with self.tracer.span("capture", "verify", instance=instance.name, shared=bool(shared)):
+                    if shared:
+                        frame = shared.acquire(instance.chat_region)
+                    else:
+                        frame = self.capture_backend.capture(instance.chat_region)
+                try:
+                    with self.tracer.span("analyze", "verify", instance=instance.name, mode=instance.verify_mode):
+                        verified = self.analyze_frame(instance, frame)
+                finally:
+                    if shared:
+                        shared.release()
+                       
+            self.metrics.inc('verify_passed' if verified else 'verify_failed', instance.name, len(commands))
+            if instance.active:  # A verdict that arrives after a pause or stop says nothing about the next run
+                self.record_outcome(instance, verified)
+            self.on_instance_updated(instance.name)
+            if verified:
+                self.log_message(f"Command {command} verified successfully", instance=instance.name)
+            else:
+                self.log_message(f"Command {command} verification failed (no expected response)", level="WARNING",
+                                 instance=instance.name)
+            return verified
+           
+        except ImportError as e:
+            self.log_message(f"{e.name or e} not installed; skipping verification", level="WARNING")
+            self.record_outcome(instance, True)
+            return True  # Assume success if not installed
+        except Exception as e:
+            self.log_message(f"Error verifying command {command}: {e}", level="ERROR", instance=instance.name)
+            return False
+           
+    def analyze_frame(self, instance, frame):
+        """Check a captured chat region for Mudae's reply, skipping OCR when the region did not change"""
+        mode = effective_verify_mode(instance.verify_mode)
+        if mode != instance.verify_mode and not self.warned_no_templates:
+            self.warned_no_templates = True
+            self.log_message(f"No templates in {get_template_verifier().template_dir}; "
+                             "template-mode instances are verified with OCR", level="WARNING")
+        if mode == "ocr" and not instance.change_detector.changed(frame):
+            # Nothing appeared since the last analysed frame, so the command just sent got no reply
+            instance.ocr_skipped += 1
+            verified = False
+        else:
+            verified = self.verification_pool.analyze(instance.name, frame, mode)
+            if mode == "ocr":
+                instance.ocr_runs += 1
+               
+        if self.recorder:
+            self.recorder.frame(instance.name, frame, instance.verify_mode, verified)
+        return verified
+   
+    def detect_chat_regions(self, frame=None):
+        """Propose a chat region for every Discord message box, capturing every monitor once unless given a frame
+
+        Regions are in screen coordinates, which are negative on monitors left of or above the primary one.
+        """
+        left = top = 0
+        if frame is None:
+            left, top, width, height = self.capture_backend.virtual_screen()
+            # A one-off grab of the whole desktop: not worth keeping as a cached region buffer
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            self.capture_backend.count_allocations(1)
+            self.capture_backend.capture((left, top, width, height), out=frame)
+        if self.region_detector is None:
+            self.region_detector = ChatRegionDetector()
+        return [(x + left, y + top, w, h) for x, y, w, h in self.region_detector.detect(frame)]
+   
+    def reachable_regions(self, regions):
+        """The regions the input device can click into; detection also finds boxes on monitors it cannot reach"""
+        reachable = [region for region in regions if self.validate_region(region)]
+        if len(reachable) < len(regions):
+            self.log_message(f"Skipped {len(regions) - len(reachable)} chat regions outside the screen the input "
+                             "device can reach", level="WARNING")
+        return reachable
+   
+    def create_instances_for_regions(self, regions, w_interval=3600, rolls_interval=180, verify_mode="ocr",
+                                     prefix="discord"):
+        """Add one instance per reachable chat region in one pass; returns the new instance names"""
+        regions = self.reachable_regions(regions)
+        numbers = itertools.count(1)
+        names = []
+        for region in regions:
+            name = next(f"{prefix}-{n}" for n in numbers if f"{prefix}-{n}" not in self.instances)
+            self.instances[name] = MudaeInstance(name, list(region), w_interval, rolls_interval, verify_mode)
+            names.append(name)
+        if names:
+            self.on_instances_changed()
+        return names
+   
+    def set_shared_capture(self, enabled):
+        """Switch between one grab per instance and one shared grab per tick"""
+        if not enabled:
+            self.shared_capture = None
+        elif self.shared_capture is None or self.shared_capture.backend is not self.capture_backend:
+            self.shared_capture = SharedDesktopCapture(self.capture_backend, self.active_regions)
+           
+    def active_regions(self):
+        """Chat regions of the instances currently sending commands"""
+        return [instance.chat_region for instance in list(self.instances.values())
+                if instance.active and instance.chat_region]
+       
+    def automation_loop(self):
+        """Single dispatcher serving every instance in earliest-deadline-first order"""
+        while True:
+            with self.tracer.span("scheduler wait", "dispatch"):
+                due, instance_name, command = self.scheduler.next_due()
+            with self.tracer.span("dispatch", "dispatch", instance=instance_name, command=command,
+                                  late_ms=round((self.clock.monotonic() - due) * 1000, 1)):
+                self.dispatch_guarded(due, instance_name, command)
+           
+    def run_until(self, deadline):
+        """Dispatch every command due before a deadline on the calling thread (virtual clocks)"""
+        while True:
+            entry = self.scheduler.pop_until(deadline)
+            if entry is None:
+                return
+            self.clock.advance_to(entry[0])
+            self.dispatch_guarded(*entry)
+           
+    def dispatch_guarded(self, due, instance_name, command):
+        """dispatch_command that never raises: one instance's failure must not stop the fleet's only dispatcher"""
+        try:
+            self.dispatch_command(due, instance_name, command)
+        except Exception as e:
+            self.log_message(f"Error dispatching {command}: {e}", level="ERROR", instance=instance_name)
+            instance = self.instances.get(instance_name)
+            if instance is None or not instance.active:
+                return
+            try:
+                # The failed dispatch may have taken any of the instance's commands off the queue
+                self.record_outcome(instance, False)
+                self.schedule_instance(instance, self.failed_command_delay)
+            except Exception as e:
+                self.log_message(f"Error rescheduling after a failed dispatch: {e}", level="ERROR",
+                                 instance=instance_name)
+           
+    def dispatch_command(self, due, instance_name, command):
+        """Make one send attempt for a due command and queue the instance's next one (or a retry)"""
+        instance = self.instances.get(instance_name)
+        if instance is None or not instance.running or instance.paused:
+            return
+       
+        # Keep the random human-like gap between two commands of the same instance
+        current_time = self.clock.monotonic()
+        if current_time < instance.cooldown_until:
+            self.scheduler.schedule(instance_name, command, instance.cooldown_until)
+            return
+       
+        # A quarantined instance gets no input time until its backoff expires
+        breaker = instance.breaker
+        if not breaker.allow(current_time):
+            self.scheduler.schedule(instance_name, command, breaker.open_until)
+            return
+        probing = breaker.state == CircuitBreaker.HALF_OPEN
+       
+        # Commands of this instance coming due shortly ride along in the same focus session
+        batch = [command] + [other for _, other in
+                             self.scheduler.take_due(instance_name, current_time + self.coalesce_window)]
+       
+        # A probe is a single attempt: no retries for an instance that is known to be broken
+        attempts = 1 if probing else self.retry_attempts
+        attempt = 1 + max(instance.send_attempts.get(command, (0,))[0] for command in batch)
+       
+        self.metrics.observe('dispatch_lateness_seconds', instance_name, current_time - due)
+        generation = self.scheduler.generation(instance_name)
+        instance.idle.clear()
+        try:
+            sent = self.send_commands_to_instance(instance, batch, attempt)
+        finally:
+            instance.idle.set()
+        for command in sent:
+            instance.mark_sent(command, current_time)
+            first_attempt = instance.send_attempts.pop(command, (0, current_time))[1]
+            self.metrics.observe('send_latency_seconds', instance_name, self.clock.monotonic() - first_attempt)
+            if self.state_store:
+                self.state_store.record(instance, command)
+        if sent:
+            instance.cooldown_until = self.clock.monotonic() + self.random.uniform(1, 3)
+           
+        unsent = batch[len(sent):]
+        retry = []
+        if not instance.active:
+            for command in unsent:
+                instance.send_attempts.pop(command, None)  # A send cut short by stop or pause starts over
+        elif unsent and attempt < attempts:
+            retry = unsent
+            for command in unsent:
+                instance.send_attempts[command] = (attempt, instance.send_attempts.get(command, (0, current_time))[1])
+        elif unsent:
+            for command in unsent:
+                instance.send_attempts.pop(command, None)
+            self.give_up(instance, unsent, attempt)
+            self.record_outcome(instance, False)
+        elif not self.verify_enabled:
+            self.record_outcome(instance, True)  # Otherwise the verification verdict decides
+        self.on_instance_updated(instance_name)
+       
+        # Stopped or paused during the send: the queue was cancelled and resuming rebuilds it from the send times
+        if not instance.active:
+            return
+        # Resumed or restarted during the send: the queue was rebuilt before these send times were recorded
+        if self.scheduler.generation(instance_name) != generation:
+            self.schedule_instance(instance)
+            return
+        for command in batch:
+            if command in sent:
+                due = current_time + instance.interval_for(command)
+            elif command in retry:
+                # Back off exponentially; the dispatcher serves other instances meanwhile
+                due = self.clock.monotonic() + self.retry_backoff * 2 ** (attempt - 1)
+            elif breaker.state == CircuitBreaker.OPEN:
+                due = breaker.open_until
+            else:
+                due = self.clock.monotonic() + self.failed_command_delay
+            # A pause and resume right now rebuilds the queue, so this one must not add to it
+            self.scheduler.schedule(instance_name, command, due, generation=generation)
+           
+    def record_outcome(self, instance, success):
+        """Feed a send or verification result to the instance's circuit breaker and report quarantine changes"""
+        breaker = instance.breaker
+        state = breaker.record(success, self.clock.monotonic())
+        if state == CircuitBreaker.OPEN:
+            self.metrics.inc('quarantines', instance.name)
+            self.log_message(f"Quarantined after {breaker.failures} failed commands; "
+                             f"probing again in {breaker.backoff():g} seconds", level="WARNING",
+                             instance=instance.name)
+        elif state == CircuitBreaker.CLOSED:
+            self.log_message("Recovered; leaving quarantine", instance=instance.name)
+        if state in (CircuitBreaker.OPEN, CircuitBreaker.CLOSED):
+            self.on_instances_changed()
+           
+    def ensure_dispatcher(self):
+        """Start the shared dispatcher thread if it is not running yet"""
+        if not self.clock.realtime:
+            return  # run_until() drives dispatch on virtual clocks
+        if self.dispatcher_thread is None or not self.dispatcher_thread.is_alive():
+            self.dispatcher_thread = threading.Thread(target=self.automation_loop, daemon=True)
+            self.dispatcher_thread.start()
+           
+    def schedule_instance(self, instance, start_offset=0):
+        """Replace an instance's queue with the next send of every command on its timetable, resuming its cadence"""
+        current_time = self.clock.monotonic()
+        entries = []
+        for command in instance.commands():
+            if instance.last_sent(command):
+                due = current_time + max(start_offset, instance.seconds_until(command, current_time))
+            else:
+                due = current_time + start_offset + instance.offset_for(command)
+            entries.append((command, due))
+        self.scheduler.replace(instance.name, entries)
+           
+    def start_instance(self, instance_name, start_offset=0, notify=True):
+        """Start automation for a specific instance"""
+        if instance_name not in self.instances:
+            return
+           
+        instance = self.instances[instance_name]
+        instance.running = True
+        instance.paused = False
+        instance.breaker.reset()  # A manual (re)start gets a clean slate
+       
+        self.ensure_dispatcher()
+        self.schedule_instance(instance, start_offset)
+       
+        self.log_message(f"Started automation for: {instance_name}")
+        if notify:
+            self.on_instances_changed()
+       
+    def pause_instance(self, instance_name, paused=None, notify=True):
+        """Pause or resume automation for a specific instance (default: toggle)"""
+        if instance_name in self.instances:
+            instance = self.instances[instance_name]
+            paused = not instance.paused if paused is None else paused
+            if paused == instance.paused:
+                return
+            instance.paused = paused
+            if instance.paused:
+                self.scheduler.cancel(instance_name)
+            elif instance.running:
+                self.schedule_instance(instance)
+            status = "paused" if instance.paused else "resumed"
+            self.log_message(f"{instance_name} automation {status}")
+            if notify:
+                self.on_instances_changed()
+           
+    def stop_instance(self, instance_name, notify=True):
+        """Stop automation for a specific instance with error handling"""
+        try:
+            if instance_name in self.instances:
+                instance = self.instances[instance_name]
+                instance.running = False
+                instance.paused = False
+                self.scheduler.cancel(instance_name)
+                   
+                self.log_message(f"Stopped automation for: {instance_name}")
+                if notify:
+                    self.on_instances_changed()
+        except Exception as e:
+            self.log_message(f"Error stopping {instance_name}: {e}", level="ERROR")
+           
+    def select_instances(self, names=None, tag=None):
+        """Names of the given instances (default: all), keeping only those with a group tag if one is given"""
+        names = list(self.instances) if names is None else [name for name in names if name in self.instances]
+        if tag:
+            names = [name for name in names if tag in self.instances[name].tags]
+        return names
+   
+    def group_tags(self):
+        """Every group tag in use, sorted"""
+        return sorted({tag for instance in self.instances.values() for tag in instance.tags})
+   
+    def start_instances(self, names=None, tag=None):
+        """Start several instances in one pass, spreading their first commands over time"""
+        stopped = [name for name in self.select_instances(names, tag) if not self.instances[name].running]
+        for position, name in enumerate(stopped):
+            self.start_instance(name, start_offset=position * self.start_stagger, notify=False)
+        if stopped:
+            self.on_instances_changed()
+        return stopped
+   
+    def pause_instances(self, names=None, tag=None, paused=None):
+        """Pause or resume (default: toggle) several running instances in one pass"""
+        running = [name for name in self.select_instances(names, tag) if self.instances[name].running]
+        for name in running:
+            self.pause_instance(name, paused, notify=False)
+        if running:
+            self.on_instances_changed()
+        return running
+   
+    def stop_instances(self, names=None, tag=None):
+        """Stop several instances in one pass"""
+        names = self.select_instances(names, tag)
+        for name in names:
+            self.stop_instance(name, notify=False)
+        if names:
+            self.on_instances_changed()
+        return names
+   
+    def start_all_instances(self):
+        """Start all instances, spreading their first commands over time"""
+        self.start_instances()
+               
+    def pause_all_instances(self):
+        """Pause all running instances"""
+        self.pause_instances()
+               
+    def stop_all_instances(self):
+        """Stop all instances"""
+        self.stop_instances()
+           
+    def stop_instances_async(self, names, timeout=10):
+        """Stop instances right away; the returned future resolves once none of them is mid-command"""
+        names = self.stop_instances(names)
+        instances = [self.instances[name] for name in names]
+        return self.control_pool.submit(self.wait_idle, instances, timeout)
+   
+    def wait_idle(self, instances, timeout=10):
+        """Wait until no instance is sending a command; True if they all finished in time"""
+        deadline = time.monotonic() + timeout
+        return all(instance.idle.wait(max(0, deadline - time.monotonic())) for instance in instances)
+           
+    def save_instances(self):
+        """Save instances to file"""
+        try:
+            data = {name: instance.to_dict() for name, instance in self.instances.items()}
+            with open(self.config_file, 'w') as f:
+                json.dump(data, f, indent=2)
+        except Exception as e:
+            self.log_message(f"Error saving instances: {e}", level="ERROR")
+            self.report_error("Error", f"Failed to save instances: {e}")
+           
+    def load_instances(self):
+        """Load instances from file"""
+        try:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, 'r') as f:
+                    data = json.load(f)
+                   
+                if self.state_store:
+                    self.state_store.load()
+                for name, instance_data in data.items():
+                    self.instances[name] = MudaeInstance.from_dict(instance_data)
+                    if self.state_store:
+                        self.state_store.restore(self.instances[name])
+                   
+                self.log_message(f"Loaded {len(self.instances)} instances from config")
+                self.on_instances_changed()
+        except Exception as e:
+            self.log_message(f"Error loading instances: {e}", level="ERROR")
+            self.report_error("Error", f"Failed to load instances: {e}")
+           
+    def log_message(self, message, level="INFO", instance=None):
+        """Add message to log with full timestamp and save to file
+
+        level is one of LogModel.LEVELS; instance names the instance the message is about (shown as a prefix).
+        """
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        if instance is not None:
+            message = f"[{instance}] {message}"
+        self.display_log(timestamp, message, level, instance)
+       
+        # Hand off to the background writer; never touch the disk here
+        if self.log_writer:
+            self.log_writer.write(message, level, instance)
+           
+    def display_log(self, timestamp, message, level="INFO", instance=None):
+        """Show a log line to the user (the console unless a front end overrides this)"""
+        if self.echo_log:
+            print(f"[{timestamp}] {message}")
+           
+    def on_instances_changed(self):
+        """Hook for front ends: instance list or run states changed"""
+       
+    def on_instance_updated(self, instance_name):
+        """Hook for front ends: one instance's schedule or counters changed (called from worker threads)"""
+       
+    def report_error(self, title, message):
+        """Hook for front ends: surface an error the user should see (already logged)"""
+       
+def run_scaling_benchmark(instance_count, days=1.0, command_delay=0.2, seed=0):
+    """Simulate a fleet on a virtual clock with a recording input device and report how it scales"""
+    clock = VirtualClock()
+    engine = AutomationEngine(clock=clock, input_backend=RecordingInput(clock=clock.monotonic),
+                              log_file=None, echo_log=False, seed=seed, state_file=None)
+    engine.command_delay = command_delay
+    for index in range(instance_count):
+        name = f"bench-{index}"
+        engine.instances[name] = MudaeInstance(name, (100, 100, 600, 80), 3600, 180)
+       
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    engine.start_all_instances()
+    simulated_seconds = days * 24 * 3600
+    engine.run_until(clock.monotonic() + simulated_seconds)
+    cpu_seconds = time.process_time() - cpu_start
+   
+    def merged(metric):
+        return LatencyHistogram.merged(engine.metrics.histogram(metric, name) or LatencyHistogram()
+                                       for name in engine.instances)
+   
+    lateness = merged('dispatch_lateness_seconds')
+    lock_hold = merged('lock_hold_seconds')
+    sent = sum(engine.metrics.counter('commands_sent', name) for name in engine.instances)
+    return {
+        'instances': instance_count,
+        'simulated_days': days,
+        'commands': sent,
+        'commands_per_sec': round(sent / simulated_seconds, 4),
+        'lateness_p50_s': round(lateness.percentile(0.5), 3),
+        'lateness_p95_s': round(lateness.percentile(0.95), 3),
+        'lateness_p99_s': round(lateness.percentile(0.99), 3),
+        'lateness_max_s': round(lateness.max, 3),
+        'lock_utilization': round(lock_hold.total / simulated_seconds, 4),
+        'cpu_seconds': round(cpu_seconds, 3),
+        'wall_seconds': round(time.perf_counter() - wall_start, 3),
+    }
+
+class HeadlessAutomation(AutomationEngine):
+    """Front end for unattended (e.g. Xvfb) boxes: runs instances from the config file without any Tk objects"""
+    def __init__(self, config_file="mudae_instances.json", log_file="mudae_log.txt", echo_log=True,
+                 state_file="mudae_state.json"):
+        super().__init__(log_file=log_file, echo_log=echo_log, state_file=state_file)
+        STARTUP.mark("engine setup")
+        self.config_file = config_file
+        self.stop_requested = threading.Event()
+        self.load_instances()
+        STARTUP.mark("config load")
+       
+    def run(self, names=None, tag=None):
+        """Start the given instances (default: all, or those with a group tag) and block until interrupted"""
+        names = list(self.instances) if names is None else names
+        unknown = [name for name in names if name not in self.instances]
+        if unknown:
+            self.log_message(f"Unknown instances in {self.config_file}: {', '.join(unknown)}", level="WARNING")
+            return False
+        names = self.select_instances(names, tag)
+        if not names:
+            self.log_message(f"No instances found in {self.config_file}", level="WARNING")
+            return False
+           
+        # SIGTERM (systemd, docker stop) and Ctrl+C both stop gracefully
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.stop_requested.set())
+           
+        self.log_message(f"Headless runner starting {len(names)} instances")
+        self.start_instances(names)
+           
+        # Short waits keep signal handling responsive on every platform
+        while not self.stop_requested.wait(1):
+            pass
+           
+        # Let an in-flight command finish so no half-typed input is left behind
+        self.stop_instances_async(list(self.instances)).result()
+        self.log_message("Headless runner stopped")
+        return True
+
+class ShardStateRelay(ScheduleStateStore):
+    """Schedule state of a shard worker: restored from the coordinator's records, updates sent back over IPC
+
+    The coordinator owns the state file, so a relay never reads, writes or deletes it.
+    """
+    def __init__(self, display, records, events, clock):
+        super().__init__(path=None, clock=clock)
+        self.display = display
+        self.records = records
+        self.events = events
+       
+    def load(self):
+        pass  # The records came from the coordinator
+       
+    def update(self, instance_name, command, sent_wall):
+        self.events.put(('sent', self.display, instance_name, command, sent_wall))
+       
+    def forget(self, instance_name):
+        pass
+   
+    def clear(self):
+        pass
+
+class ShardWorker(HeadlessAutomation):
+    """Runs one group of instances on its own X display, input device and lock; reports to the coordinator"""
+    STATUS_INTERVAL = 2  # Seconds between status reports
+   
+    def __init__(self, display, config_file, state_records, events, control):
+        self.display = display
+        self.events = events
+        super().__init__(config_file, log_file=None, echo_log=False, state_file=None)
+        self.state_store = ShardStateRelay(display, state_records, events, self.clock)
+        for instance in self.instances.values():
+            self.state_store.restore(instance)
+           
+        threading.Thread(target=self.listen, args=(control,), daemon=True).start()
+        threading.Thread(target=self.report_status, daemon=True).start()
+       
+    def display_log(self, timestamp, message, level="INFO", instance=None):
+        self.events.put(('log', self.display, timestamp, message, level, instance))
+       
+    def listen(self, control):
+        """Stop when the coordinator asks to"""
+        while control.get() != 'stop':
+            pass
+        self.stop_requested.set()
+       
+    def report_status(self):
+        while not self.stop_requested.wait(self.STATUS_INTERVAL):
+            current_time = self.clock.monotonic()
+            status = {
+                name: {
+                    'status': instance.status,
+                    'next': {command: int(instance.seconds_until(command, current_time))
+                             for command in instance.commands()},
+                }
+                for name, instance in self.instances.items() if instance.running
+            }
+            self.events.put(('status', self.display, status))
+
+def run_shard_worker(display, config_file, names, state_records, events, control):
+    """Worker-process entry point: drive a group of instances on one X display (already set in its environment)"""
+    worker = ShardWorker(display, config_file, state_records, events, control)
+    worker.instances = {name: worker.instances[name] for name in names}  # Only this shard's group
+    worker.run(names)
+    events.put(('exit', display))
+
+class ShardCoordinator:
+    """Spreads instances over several X displays, one worker process each, and collects their status and logs"""
+    def __init__(self, displays, config_file="mudae_instances.json", log_file="mudae_log.txt", echo_log=True,
+                 state_file="mudae_state.json"):
+        self.displays = displays
+        self.config_file = config_file
+        self.log_writer = LogWriter(log_file) if log_file else None
+        self.echo_log = echo_log
+        self.state_store = ScheduleStateStore(state_file)
+        self.state_store.load()
+        self.context = multiprocessing.get_context("spawn")  # Fresh pyautogui import per display
+        self.events = self.context.Queue()
+        self.workers = {}  # Display -> (process, control queue)
+        self.status = {}  # Display -> latest status report
+        self.stop_requested = threading.Event()
+       
+    def log_message(self, message, display=None, level="INFO"):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.display_log(timestamp, f"[{display}] {message}" if display else message, level)
+       
+    def display_log(self, timestamp, message, level="INFO", instance=None):
+        if self.echo_log:
+            print(f"[{timestamp}] {message}")
+        if self.log_writer:
+            self.log_writer.write(message, level, instance)
+           
+    def assign(self, instances, names=None):
+        """Group instance names by display: pinned instances first, the rest to the least loaded display"""
+        shards = {display: [] for display in self.displays}
+        names = list(instances) if names is None else names
+        unpinned = []
+        for name in names:
+            if instances[name].display in shards:
+                shards[instances[name].display].append(name)
+            else:
+                unpinned.append(name)
+        for name in unpinned:
+            min(shards.values(), key=len).append(name)
+        return {display: group for display, group in shards.items() if group}
    
-    @classmethod
-    def from_dict(cls, data):
-        return cls(
-            data['name'],
-            data['chat_region'],
-            data['w_interval'],
-            data['rolls_interval']
-        )
+    def start_worker(self, display, names):
+        control = self.context.Queue()
+        process = self.context.Process(
+            target=run_shard_worker, name=f"mudae-shard{display}", daemon=True,
+            args=(display, self.config_file, names, self.state_store.records, self.events, control))
+       
+        # Spawned children copy the environment at start, which is how each one gets its display
+        previous = os.environ.get("DISPLAY")
+        os.environ["DISPLAY"] = display
+        try:
+            process.start()
+        finally:
+            if previous is None:
+                os.environ.pop("DISPLAY", None)
+            else:
+                os.environ["DISPLAY"] = previous
+        self.workers[display] = (process, control)
+        self.log_message(f"Started worker {process.pid} with {len(names)} instances", display)
+       
+    def handle(self, event):
+        kind, display = event[0], event[1]
+        if kind == 'log':
+            self.display_log(event[2], f"[{display}] {event[3]}", *event[4:])
+        elif kind == 'sent':
+            self.state_store.update(*event[2:])
+        elif kind == 'status':
+            self.status[display] = event[2]
+        elif kind == 'exit':
+            self.log_message("Worker exited", display)
+           
+    def run(self, names=None, tag=None):
+        """Start one worker per display and relay their events until interrupted"""
+        engine = AutomationEngine(log_file=None, echo_log=False, state_file=None)
+        engine.config_file = self.config_file
+        engine.load_instances()
+        unknown = [name for name in (names or []) if name not in engine.instances]
+        if unknown:
+            self.log_message(f"Unknown instances in {self.config_file}: {', '.join(unknown)}", level="WARNING")
+            return False
+        if tag:
+            names = engine.select_instances(names, tag)
+        if not engine.instances or names == []:
+            self.log_message(f"No instances found in {self.config_file}", level="WARNING")
+            return False
+           
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.stop_requested.set())
+           
+        for display, group in self.assign(engine.instances, names).items():
+            self.start_worker(display, group)
+           
+        last_summary = time.monotonic()
+        while not self.stop_requested.is_set() and any(p.is_alive() for p, _ in self.workers.values()):
+            try:
+                self.handle(self.events.get(timeout=1))
+            except queue.Empty:
+                pass
+            if time.monotonic() - last_summary >= 60:
+                last_summary = time.monotonic()
+                running = sum(len(status) for status in self.status.values())
+                self.log_message(f"Fleet: {running} instances running on {len(self.workers)} displays")
+               
+        for _, control in self.workers.values():
+            control.put('stop')
+        deadline = time.monotonic() + 10
+        while any(p.is_alive() for p, _ in self.workers.values()) and time.monotonic() < deadline:
+            try:
+                self.handle(self.events.get(timeout=0.5))
+            except queue.Empty:
+                pass
+        for display, (process, _) in self.workers.items():
+            if process.is_alive():
+                self.log_message("Worker did not stop in time; terminating", display, "WARNING")
+                process.terminate()
+        self.state_store.flush()
+        self.log_message("Shard coordinator stopped")
+        return True
 
-class MudaeMultiAutomation:
+class UIEventBus:
+    """Worker -> GUI queue drained by the Tk thread: log lines are batched, repeated updates coalesced"""
+    def __init__(self, max_lines=2000):
+        self.lock = threading.Lock()
+        self.lines = collections.deque(maxlen=max_lines)  # Oldest lines are dropped if the GUI falls behind
+        self.dirty = {}  # Update kind -> keys changed since the last drain
+       
+    def log(self, line):
+        with self.lock:
+            self.lines.append(line)
+           
+    def mark(self, kind, key=None):
+        """Note that something needs a redraw; repeats before the next drain cost nothing"""
+        with self.lock:
+            self.dirty.setdefault(kind, set()).add(key)
+           
+    def drain(self):
+        """Take every pending log line and update in one go"""
+        with self.lock:
+            lines, self.lines = list(self.lines), collections.deque(maxlen=self.lines.maxlen)
+            dirty, self.dirty = self.dirty, {}
+        return lines, dirty
+   
+class VirtualLogView:
+    """Tk view of a LogModel that only ever holds the rows currently on screen"""
+    LEVEL_COLORS = {'WARNING': "#b36b00", 'ERROR': "red"}
+   
+    def __init__(self, parent, model, rows=30):
+        self.model = model
+        self.rows = rows
+        self.text = tk.Text(parent, height=rows, width=80, wrap=tk.NONE, state=tk.DISABLED)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.on_scroll)
+        for level, color in self.LEVEL_COLORS.items():
+            self.text.tag_configure(level, foreground=color)
+        self.text.bind('<Configure>', self.on_resize)
+        self.text.bind('<MouseWheel>', lambda event: self.scroll_by(-1 if event.delta > 0 else 1, 3))
+        self.text.bind('<Button-4>', lambda event: self.scroll_by(-1, 3))
+        self.text.bind('<Button-5>', lambda event: self.scroll_by(1, 3))
+       
+        self.filters = (None, None, "")  # instance, level, search text
+        self.matches = None  # Seqs passing the filters; None while unfiltered
+        self.seen_seq = model.next_seq  # Lines up to here were already checked against the filters
+        self.top = 0  # Row shown on the first line
+        self.follow = True  # Keep the newest line in view
+       
+    def pack(self):
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+       
+    def row_count(self):
+        return len(self.matches) if self.matches is not None else len(self.model)
+   
+    def row_seq(self, row):
+        return self.matches[row] if self.matches is not None else self.model.first_seq + row
+   
+    def set_filters(self, instance=None, level=None, text=""):
+        self.filters = (instance, level, text)
+        self.matches = self.model.query(*self.filters) if instance or level or text else None
+        self.seen_seq = self.model.next_seq
+        self.follow = True
+        self.render()
+       
+    def refresh(self):
+        """Take in lines appended since the last call and redraw"""
+        if self.matches is not None:
+            # Forget lines the model evicted, then filter the new ones
+            first_valid = bisect.bisect_left(self.matches, self.model.first_seq)
+            if first_valid:
+                del self.matches[:first_valid]
+            for seq in range(max(self.seen_seq, self.model.first_seq), self.model.next_seq):
+                if self.model.matches(seq, *self.filters):
+                    self.matches.append(seq)
+        self.seen_seq = self.model.next_seq
+        self.render()
+       
+    def render(self):
+        count = self.row_count()
+        if self.follow:
+            self.top = max(0, count - self.rows)
+        self.top = max(0, min(self.top, count - self.rows))
+        visible = range(self.top, min(count, self.top + self.rows))
+       
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        for row in visible:
+            seq = self.row_seq(row)
+            self.text.insert(tk.END, self.model.line(seq) + "\n", (self.model.entry(seq)[2],))
+        self.text.config(state=tk.DISABLED)
+        if count:
+            self.scrollbar.set(self.top / count, (self.top + len(visible)) / count)
+        else:
+            self.scrollbar.set(0, 1)
+           
+    def scroll_by(self, amount, step=1):
+        self.top += amount * step
+        self.follow = self.top >= self.row_count() - self.rows
+        self.render()
+        return "break"
+   
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * self.row_count())
+            self.follow = self.top >= self.row_count() - self.rows
+            self.render()
+        else:
+            self.scroll_by(int(amount), self.rows if unit == "pages" else 1)
+           
+    def on_resize(self, event):
+        linespace = tkfont.Font(font=self.text.cget('font')).metrics('linespace')
+        rows = max(1, event.height // max(linespace, 1))
+        if rows != self.rows:
+            self.rows = rows
+            self.render()
+           
+class MudaeMultiAutomation(AutomationEngine):
+    UI_FRAME_MS = 100  # Queued worker events are applied to the widgets at most this often
+   
     def __init__(self):
-        self.instances = {}
-        self.automation_threads = {}
-        self.config_file = "mudae_instances.json"
-        self.pyautogui_lock = threading.Lock() 
-        self.retry_attempts = 3  # New: Default retry attempts
-        self.command_delay = 0.2  # New: Default command delay (seconds)
+        self.ui_events = UIEventBus()
+        super().__init__()
+        STARTUP.mark("engine setup")
        
         # Region selection variables
         self.selection_start = None
@@ -55,9 +2731,11 @@ class MudaeMultiAutomation:
        
         # Setup GUI first
         self.setup_gui()
+        STARTUP.mark("GUI construction")
        
         # Load saved instances after GUI is ready
         self.load_instances()
+        STARTUP.mark("config load")
        
     def setup_gui(self):
         self.root = tk.Tk()
@@ -68,6 +2746,13 @@ class MudaeMultiAutomation:
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
        
+        # View state for incremental redraws
+        self.tree_rows = {}  # Instance name -> values currently shown in the treeview
+        self.status_blocks = {}  # Instance name -> (text tag, fields currently shown)
+        self.status_block_ids = itertools.count()
+        self.metrics_rows = {}  # Instance name -> values currently shown in the metrics table
+        self.status_timer = None  # Pending root.after id of the status refresh
+       
         # Instance Management Tab
         self.setup_instance_tab()
        
@@ -76,6 +2761,9 @@ class MudaeMultiAutomation:
        
         # Log Tab
         self.setup_log_tab()
+       
+        # Metrics Tab
+        self.setup_metrics_tab()
 
         # New: Settings Tab
         self.setup_settings_tab()
@@ -102,23 +2790,36 @@ class MudaeMultiAutomation:
         self.rolls_interval_var = tk.StringVar(value="180")
         ttk.Entry(add_frame, textvariable=self.rolls_interval_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=2)
        
+        ttk.Label(add_frame, text="Verify Mode:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.verify_mode_var = tk.StringVar(value="ocr")
+        ttk.Combobox(add_frame, textvariable=self.verify_mode_var, values=VERIFY_MODES,
+                     state="readonly", width=10).grid(row=3, column=1, sticky=tk.W, pady=2)
+       
+        ttk.Label(add_frame, text="Group Tags (comma-separated):").grid(row=4, column=0, sticky=tk.W, pady=2)
+        self.tags_var = tk.StringVar()
+        ttk.Entry(add_frame, textvariable=self.tags_var, width=20).grid(row=4, column=1, sticky=tk.W, pady=2)
+       
+        ttk.Label(add_frame, text="Extra Commands (cmd:interval[:offset], ...):").grid(row=5, column=0, sticky=tk.W, pady=2)
+        self.extra_commands_var = tk.StringVar()
+        ttk.Entry(add_frame, textvariable=self.extra_commands_var, width=30).grid(row=5, column=1, sticky=tk.W, pady=2)
+       
         # Buttons
         button_frame = ttk.Frame(add_frame)
-        button_frame.grid(row=3, column=0, columnspan=2, pady=10)
+        button_frame.grid(row=6, column=0, columnspan=2, pady=10)
        
         ttk.Button(button_frame, text="Select Chat Region", command=self.select_region_for_new).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Add Instance", command=self.add_instance).pack(side=tk.LEFT, padx=5)
        
         self.temp_region = None
         self.region_status = ttk.Label(add_frame, text="No region selected", foreground="red")
-        self.region_status.grid(row=4, column=0, columnspan=2, pady=5)
+        self.region_status.grid(row=7, column=0, columnspan=2, pady=5)
        
         # Existing instances section
         list_frame = ttk.LabelFrame(instance_frame, text="Existing Instances", padding="10")
         list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
        
         # Treeview for instances
-        columns = ('Name', 'W Interval', 'Rolls Interval', 'Status')
+        columns = ('Name', 'W Interval', 'Rolls Interval', 'Status', 'Tags')
         self.instance_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=10)
        
         for col in columns:
@@ -139,6 +2840,7 @@ class MudaeMultiAutomation:
         ttk.Button(instance_btn_frame, text="Edit Selected", command=self.edit_instance).pack(side=tk.LEFT, padx=5)
         ttk.Button(instance_btn_frame, text="Delete Selected", command=self.delete_instance).pack(side=tk.LEFT, padx=5)
         ttk.Button(instance_btn_frame, text="Test Region", command=self.test_region).pack(side=tk.LEFT, padx=5)
+        ttk.Button(instance_btn_frame, text="Detect Regions", command=self.detect_regions).pack(side=tk.LEFT, padx=5)
        
         # Advanced cleanup buttons
         cleanup_btn_frame = ttk.Frame(list_frame)
@@ -180,6 +2882,17 @@ class MudaeMultiAutomation:
         self.stop_all_btn = ttk.Button(global_btn_frame, text="Stop All", command=self.stop_all_instances)
         self.stop_all_btn.pack(side=tk.LEFT, padx=5)
        
+        # Group controls
+        group_frame = ttk.LabelFrame(control_frame, text="Group Controls", padding="10")
+        group_frame.pack(fill=tk.X, padx=5, pady=5)
+       
+        self.group_var = tk.StringVar()
+        self.group_combo = ttk.Combobox(group_frame, textvariable=self.group_var, state="readonly", width=20)
+        self.group_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Button(group_frame, text="Start Group", command=self.start_selected_group).pack(side=tk.LEFT, padx=5)
+        ttk.Button(group_frame, text="Pause Group", command=self.pause_selected_group).pack(side=tk.LEFT, padx=5)
+        ttk.Button(group_frame, text="Stop Group", command=self.stop_selected_group).pack(side=tk.LEFT, padx=5)
+       
         # Individual instance controls
         individual_frame = ttk.LabelFrame(control_frame, text="Individual Controls", padding="10")
         individual_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -215,17 +2928,119 @@ class MudaeMultiAutomation:
         log_frame = ttk.Frame(self.notebook)
         self.notebook.add(log_frame, text="Logs")
        
-        # Log display
-        self.log_text = tk.Text(log_frame, height=30, width=80)
-        log_scrollbar = ttk.Scrollbar(log_frame, orient="vertical", command=self.log_text.yview)
-        self.log_text.configure(yscrollcommand=log_scrollbar.set)
-       
-        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        log_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # Filters
+        filter_frame = ttk.Frame(log_frame)
+        filter_frame.pack(fill=tk.X, padx=5, pady=5)
+       
+        ttk.Label(filter_frame, text="Instance:").pack(side=tk.LEFT)
+        self.log_instance_var = tk.StringVar(value="All")
+        self.log_instance_combo = ttk.Combobox(filter_frame, textvariable=self.log_instance_var, state="readonly",
+                                               values=["All"], width=15)
+        self.log_instance_combo.pack(side=tk.LEFT, padx=5)
+        self.log_instance_combo.bind('<<ComboboxSelected>>', lambda event: self.apply_log_filters())
+       
+        ttk.Label(filter_frame, text="Level:").pack(side=tk.LEFT)
+        self.log_level_var = tk.StringVar(value="All")
+        level_combo = ttk.Combobox(filter_frame, textvariable=self.log_level_var, state="readonly",
+                                   values=["All", *LogModel.LEVELS], width=10)
+        level_combo.pack(side=tk.LEFT, padx=5)
+        level_combo.bind('<<ComboboxSelected>>', lambda event: self.apply_log_filters())
+       
+        ttk.Label(filter_frame, text="Search:").pack(side=tk.LEFT)
+        self.log_search_var = tk.StringVar()
+        search_entry = ttk.Entry(filter_frame, textvariable=self.log_search_var, width=20)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        search_entry.bind('<Return>', lambda event: self.apply_log_filters())
+        ttk.Button(filter_frame, text="Search", command=self.apply_log_filters).pack(side=tk.LEFT, padx=5)
        
         # Clear log button
-        ttk.Button(log_frame, text="Clear Log", command=self.clear_log).pack(pady=5)
+        ttk.Button(log_frame, text="Clear Log", command=self.clear_log).pack(side=tk.BOTTOM, pady=5)
+       
+        # Log display: a capped model, of which only the visible rows are ever rendered
+        self.log_model = LogModel()
+        self.log_view = VirtualLogView(log_frame, self.log_model)
+        self.log_view.pack()
 
+    def setup_metrics_tab(self):
+        metrics_frame = ttk.Frame(self.notebook)
+        self.notebook.add(metrics_frame, text="Metrics")
+       
+        columns = ('Instance', 'Sent', 'Failed', 'Retries', 'Verified', 'Unverified',
+                   'Late p95 (s)', 'Send p95 (s)', 'Verify Queue p95 (s)')
+        self.metrics_tree = ttk.Treeview(metrics_frame, columns=columns, show='headings', height=15)
+        for col in columns:
+            self.metrics_tree.heading(col, text=col)
+            self.metrics_tree.column(col, width=80)
+        self.metrics_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+       
+        export_frame = ttk.LabelFrame(metrics_frame, text="Export", padding="10")
+        export_frame.pack(fill=tk.X, padx=5, pady=5)
+       
+        ttk.Button(export_frame, text="Export Prometheus",
+                   command=lambda: self.export_metrics("prometheus")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(export_frame, text="Export JSON",
+                   command=lambda: self.export_metrics("json")).pack(side=tk.LEFT, padx=5)
+       
+        self.auto_export_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(export_frame, text="Auto-export every 15 s",
+                        variable=self.auto_export_var, command=self.toggle_metrics_export).pack(side=tk.LEFT, padx=5)
+        self.export_format_var = tk.StringVar(value="prometheus")
+        format_combo = ttk.Combobox(export_frame, textvariable=self.export_format_var, values=("prometheus", "json"),
+                                    state="readonly", width=12)
+        format_combo.pack(side=tk.LEFT, padx=5)
+        format_combo.bind('<<ComboboxSelected>>', lambda event: self.toggle_metrics_export())
+       
+    def metrics_path(self, fmt):
+        return "mudae_metrics.json" if fmt == "json" else "mudae_metrics.prom"
+   
+    def export_metrics(self, fmt):
+        """Write the current metrics once"""
+        try:
+            self.metrics.export(self.metrics_path(fmt), fmt)
+            self.log_message(f"Metrics exported to {self.metrics_path(fmt)}")
+        except Exception as e:
+            self.log_message(f"Error exporting metrics: {e}", level="ERROR")
+            messagebox.showerror("Error", f"Failed to export metrics: {e}")
+           
+    def toggle_metrics_export(self):
+        """Start, restart (e.g. in a new format) or stop the periodic metrics export"""
+        if self.auto_export_var.get():
+            fmt = self.export_format_var.get()
+            self.metrics.start_periodic_export(self.metrics_path(fmt), fmt)
+            self.log_message(f"Exporting metrics to {self.metrics_path(fmt)} every 15 seconds")
+        else:
+            self.metrics.stop_periodic_export()
+           
+    def refresh_metrics_view(self):
+        """Update the metrics table in place, touching only rows that changed"""
+        def p95(metric, name):
+            histogram = self.metrics.histogram(metric, name)
+            return histogram.percentile(0.95) if histogram else "-"
+       
+        names = self.metrics.instance_names()
+        for name in list(self.metrics_rows):
+            if name not in names:
+                self.metrics_tree.delete(name)
+                del self.metrics_rows[name]
+               
+        for name in names:
+            values = (
+                name,
+                self.metrics.counter('commands_sent', name),
+                self.metrics.counter('commands_failed', name),
+                self.metrics.counter('retries', name),
+                self.metrics.counter('verify_passed', name),
+                self.metrics.counter('verify_failed', name),
+                p95('dispatch_lateness_seconds', name),
+                p95('send_latency_seconds', name),
+                p95('verify_queue_seconds', name),
+            )
+            if name not in self.metrics_rows:
+                self.metrics_tree.insert('', 'end', iid=name, values=values)
+            elif self.metrics_rows[name] != values:
+                self.metrics_tree.item(name, values=values)
+            self.metrics_rows[name] = values
+           
     def setup_settings_tab(self):
         settings_frame = ttk.Frame(self.notebook)
         self.notebook.add(settings_frame, text="Settings")
@@ -238,18 +3053,137 @@ class MudaeMultiAutomation:
         self.delay_var = tk.StringVar(value=str(self.command_delay))
         ttk.Entry(settings_frame, textvariable=self.delay_var, width=10).pack(fill=tk.X, pady=5)
        
+        ttk.Label(settings_frame, text="Typing Mode:").pack(anchor=tk.W, pady=5)
+        self.input_backend_var = tk.StringVar(value=self.input_backend.name)
+        ttk.Combobox(settings_frame, textvariable=self.input_backend_var, state="readonly",
+                     values=[name for name in INPUT_BACKENDS if name != 'recording']).pack(fill=tk.X, pady=5)
+       
+        ttk.Label(settings_frame, text="Start All Stagger (seconds):").pack(anchor=tk.W, pady=5)
+        self.stagger_var = tk.StringVar(value=str(self.start_stagger))
+        ttk.Entry(settings_frame, textvariable=self.stagger_var, width=10).pack(fill=tk.X, pady=5)
+       
+        ttk.Label(settings_frame, text="Coalesce Window (seconds):").pack(anchor=tk.W, pady=5)
+        self.coalesce_var = tk.StringVar(value=str(self.coalesce_window))
+        ttk.Entry(settings_frame, textvariable=self.coalesce_var, width=10).pack(fill=tk.X, pady=5)
+       
+        self.verify_var = tk.BooleanVar(value=self.verify_enabled)
+        ttk.Checkbutton(settings_frame, text="Verify responses (OCR mode requires pytesseract)",
+                        variable=self.verify_var).pack(anchor=tk.W, pady=5)
+       
+        self.verify_processes_var = tk.BooleanVar(value=self.verification_pool.use_processes)
+        ttk.Checkbutton(settings_frame, text="Analyze frames in worker processes",
+                        variable=self.verify_processes_var).pack(anchor=tk.W, pady=5)
+       
+        ttk.Label(settings_frame, text="Capture Backend:").pack(anchor=tk.W, pady=5)
+        self.capture_backend_var = tk.StringVar(value=self.capture_backend.name)
+        ttk.Combobox(settings_frame, textvariable=self.capture_backend_var, state="readonly",
+                     values=[name for name in CAPTURE_BACKENDS if name != 'fake']).pack(fill=tk.X, pady=5)
+        ttk.Button(settings_frame, text="Benchmark Capture", command=self.benchmark_capture_backend).pack(anchor=tk.W, pady=5)
+       
+        self.shared_capture_var = tk.BooleanVar(value=self.shared_capture is not None)
+        ttk.Checkbutton(settings_frame, text="Shared capture (one desktop grab per tick for all instances)",
+                        variable=self.shared_capture_var).pack(anchor=tk.W, pady=5)
+       
+        trace_frame = ttk.Frame(settings_frame)
+        trace_frame.pack(anchor=tk.W, pady=5)
+        self.trace_var = tk.BooleanVar(value=self.tracer.enabled)
+        ttk.Checkbutton(trace_frame, text="Trace the send path (Chrome/Perfetto trace)",
+                        variable=self.trace_var, command=self.toggle_tracing).pack(side=tk.LEFT)
+        ttk.Button(trace_frame, text="Export Trace", command=self.export_trace).pack(side=tk.LEFT, padx=5)
+       
+        self.structured_log_var = tk.BooleanVar(value=self.log_writer.structured)
+        ttk.Checkbutton(settings_frame, text="Structured JSON log (mudae_log.jsonl)",
+                        variable=self.structured_log_var).pack(anchor=tk.W, pady=5)
+       
         ttk.Button(settings_frame, text="Save Settings", command=self.save_settings).pack(pady=10)
        
     def save_settings(self):
         try:
             self.retry_attempts = int(self.retry_var.get())
             self.command_delay = float(self.delay_var.get())
+            self.start_stagger = float(self.stagger_var.get())
+            self.coalesce_window = float(self.coalesce_var.get())
+            if self.input_backend_var.get() != self.input_backend.name:
+                self.input_backend = INPUT_BACKENDS[self.input_backend_var.get()]()
+            self.log_writer.structured = self.structured_log_var.get()
+            self.verify_enabled = self.verify_var.get()
+            if self.verify_processes_var.get() != self.verification_pool.use_processes:
+                # The old pool finishes its running jobs in the background
+                self.control_pool.submit(self.verification_pool.close)
+                self.verification_pool = VerificationPool(use_processes=self.verify_processes_var.get())
+            if self.capture_backend_var.get() != self.capture_backend.name:
+                self.capture_backend = create_capture_backend(self.capture_backend_var.get())
+            self.set_shared_capture(self.shared_capture_var.get())
             self.log_message("Settings saved successfully")
             messagebox.showinfo("Success", "Settings saved!")
         except ValueError:
-            self.log_message("Invalid settings values")
+            self.log_message("Invalid settings values", level="ERROR")
             messagebox.showerror("Error", "Please enter valid numbers for settings")
        
+    def toggle_tracing(self):
+        """Turn span tracing on or off right away (no need to save settings)"""
+        self.tracer.enabled = self.trace_var.get()
+        self.log_message(f"Tracing {'enabled' if self.tracer.enabled else 'disabled'}")
+       
+    def export_trace(self):
+        """Write the buffered spans to mudae_trace.json"""
+        try:
+            count = self.tracer.export("mudae_trace.json")
+            self.log_message(f"Exported {count} spans to mudae_trace.json (open in ui.perfetto.dev)")
+        except Exception as e:
+            self.log_message(f"Error exporting trace: {e}", level="ERROR")
+            messagebox.showerror("Error", f"Failed to export trace: {e}")
+           
+    def benchmark_capture_backend(self):
+        """Benchmark the selected capture backend on the first instance region in the background"""
+        backend = create_capture_backend(self.capture_backend_var.get())
+        regions = [instance.chat_region for instance in self.instances.values() if instance.chat_region]
+        region = regions[0] if regions else (0, 0, 800, 600)
+       
+        def run():
+            try:
+                self.log_message(f"Capture benchmark: {benchmark_capture(backend, region)}")
+            except Exception as e:
+                self.log_message(f"Capture benchmark failed: {e}", level="ERROR")
+               
+        threading.Thread(target=run, daemon=True).start()
+       
+    def detect_regions(self):
+        """Find the Discord message boxes on the desktop in the background, then offer to add them"""
+        self.log_message("Detecting chat regions...")
+        self.when_done(self.control_pool.submit(self.detect_chat_regions), self.offer_detected_regions)
+       
+    def offer_detected_regions(self, future):
+        """Create an instance for each detected chat box the user accepts"""
+        try:
+            regions = future.result()
+        except Exception as e:
+            self.log_message(f"Error detecting chat regions: {e}", level="ERROR")
+            messagebox.showerror("Error", f"Failed to detect chat regions: {e}")
+            return
+           
+        regions = self.reachable_regions(regions)
+        existing = [instance.chat_region for instance in self.instances.values() if instance.chat_region]
+        new = [region for region in regions if not any(regions_overlap(region, other) for other in existing)]
+        self.log_message(f"Detected {len(regions)} chat regions, {len(new)} not used by an instance yet")
+        if not new:
+            messagebox.showinfo("Detect Regions", "No new chat boxes found")
+            return
+           
+        listing = "\n".join(str(region) for region in new)
+        if not messagebox.askyesno("Detect Regions", f"Found {len(new)} new chat boxes:\n{listing}\n\n"
+                                                     "Create an instance for each?"):
+            return
+        try:
+            w_interval = int(self.w_interval_var.get())
+            rolls_interval = int(self.rolls_interval_var.get())
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid numbers for intervals")
+            return
+        names = self.create_instances_for_regions(new, w_interval, rolls_interval, self.verify_mode_var.get())
+        self.save_instances()
+        self.log_message(f"Added instances: {', '.join(names)}")
+       
     def select_region_for_new(self):
         """Select region for new instance"""
         self.select_chat_region(callback=self.set_temp_region)
@@ -343,7 +3277,7 @@ class MudaeMultiAutomation:
             def cancel_selection(event=None):
                 overlay.destroy()
                 self.root.deiconify()  # Show main window again
-                self.log_message("Region selection cancelled")
+                self.log_message("Region selection cancelled", level="WARNING")
                 if callback:
                     callback(None)
                
@@ -359,7 +3293,7 @@ class MudaeMultiAutomation:
             overlay.focus_set()
            
         except Exception as e:
-            self.log_message(f"Error in region selection: {e}")
+            self.log_message(f"Error in region selection: {e}", level="ERROR")
             self.root.deiconify()  # Make sure main window is visible
             if callback:
                 callback(None)
@@ -387,16 +3321,31 @@ class MudaeMultiAutomation:
             messagebox.showerror("Error", "Please enter valid numbers for intervals")
             return
            
+        try:
+            timetable = [[".w", w_interval, 0], [".rolls", rolls_interval, 0]]
+            timetable += parse_timetable(self.extra_commands_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid extra commands: {e}")
+            return
+        commands = [entry[0] for entry in timetable]
+        if len(set(commands)) != len(commands):
+            messagebox.showerror("Error", "Each command can only appear once on the timetable")
+            return
+           
         if not self.validate_region(self.temp_region):
             messagebox.showerror("Error", "Selected region is invalid (out of screen bounds)")
             return
            
         # Create new instance
-        instance = MudaeInstance(name, self.temp_region, w_interval, rolls_interval)
+        tags = [tag.strip() for tag in self.tags_var.get().split(",") if tag.strip()]
+        instance = MudaeInstance(name, self.temp_region, w_interval, rolls_interval, self.verify_mode_var.get(),
+                                 tags=tags, timetable=timetable)
         self.instances[name] = instance
        
         # Clear form
         self.name_var.set("")
+        self.tags_var.set("")
+        self.extra_commands_var.set("")
         self.temp_region = None
         self.region_status.config(text="No region selected", foreground="red")
        
@@ -459,22 +3408,26 @@ class MudaeMultiAutomation:
         pos_window.after(30000, pos_window.destroy)
        
     def refresh_instance_list(self):
-        """Refresh the instance list in the treeview"""
-        for item in self.instance_tree.get_children():
-            self.instance_tree.delete(item)
-           
-        for name, instance in self.instances.items():
-            status = "Stopped"
-            if instance.running:
-                status = "Paused" if instance.paused else "Running"
+        """Update the instance list in place, touching only rows that changed"""
+        for name in list(self.tree_rows):
+            if name not in self.instances:
+                self.instance_tree.delete(name)
+                del self.tree_rows[name]
                
-            self.instance_tree.insert('', 'end', values=(
-                name, instance.w_interval, instance.rolls_interval, status
-            ))
+        for name, instance in self.instances.items():
+            values = (name, instance.w_interval or "", instance.rolls_interval or "", instance.status, ", ".join(instance.tags))
+            if name not in self.tree_rows:
+                self.instance_tree.insert('', 'end', iid=name, values=values)
+            elif self.tree_rows[name] != values:
+                self.instance_tree.item(name, values=values)
+            self.tree_rows[name] = values
            
     def refresh_control_combo(self):
-        """Refresh the control combo box"""
+        """Refresh the control combo boxes"""
         self.instance_combo['values'] = list(self.instances.keys())
+        self.group_combo['values'] = self.group_tags()
+        if hasattr(self, 'log_instance_combo'):  # The Logs tab is built after the Control Panel
+            self.log_instance_combo['values'] = ["All", *self.instances]
        
     def edit_instance(self):
         """Edit selected instance"""
@@ -483,8 +3436,7 @@ class MudaeMultiAutomation:
             messagebox.showwarning("Warning", "Please select an instance to edit")
             return
            
-        item = self.instance_tree.item(selection[0])
-        instance_name = item['values'][0]
+        instance_name = selection[0]  # Rows use the instance name as their item id
        
         # TODO: Implement edit dialog
         messagebox.showinfo("Info", f"Edit functionality for '{instance_name}' - Coming soon!")
@@ -496,8 +3448,7 @@ class MudaeMultiAutomation:
             messagebox.showwarning("Warning", "Please select an instance to delete")
             return
            
-        item = self.instance_tree.item(selection[0])
-        instance_name = item['values'][0]
+        instance_name = selection[0]  # Rows use the instance name as their item id
        
         if messagebox.askyesno("Confirm", f"Delete instance '{instance_name}'?"):
             try:
@@ -505,14 +3456,11 @@ class MudaeMultiAutomation:
                 if instance_name in self.instances:
                     instance = self.instances[instance_name]
                     if instance.running:
-                        self.stop_instance(instance_name)
-                        time.sleep(0.5)  # Give thread time to stop
+                        self.stop_instance(instance_name)  # Takes effect at once, no need to wait
                    
                     del self.instances[instance_name]
-               
-                # Clean up thread reference
-                if instance_name in self.automation_threads:
-                    del self.automation_threads[instance_name]
+                    if self.state_store:
+                        self.state_store.forget(instance_name)
                
                 # Update displays
                 self.refresh_instance_list()
@@ -521,28 +3469,37 @@ class MudaeMultiAutomation:
                 self.log_message(f"Deleted instance: {instance_name}")
                
             except Exception as e:
-                self.log_message(f"Error deleting {instance_name}: {e}")
+                self.log_message(f"Error deleting {instance_name}: {e}", level="ERROR")
                 messagebox.showerror("Error", f"Failed to delete {instance_name}: {e}")
                
-    def force_cleanup_all(self):
-        """Force cleanup all instances and threads"""
-        try:
-            # Stop all automation threads
-            for name in list(self.instances.keys()):
-                if self.instances[name].running:
-                    self.stop_instance(name)
-           
-            # Clear thread references
-            self.automation_threads.clear()
-           
-            # Give threads time to stop
-            time.sleep(1)
+    def when_done(self, future, callback, poll_ms=50):
+        """Run a callback on the Tk thread once a background future has finished"""
+        if future.done():
+            callback(future)
+        else:
+            self.root.after(poll_ms, self.when_done, future, callback, poll_ms)
            
-            self.log_message("Force cleanup completed")
-            messagebox.showinfo("Cleanup", "All instances and threads have been force cleaned")
+    def force_cleanup_all(self, on_done=None):
+        """Force cleanup all instances and threads without blocking the GUI"""
+        def finished(future):
+            try:
+                if not future.result():
+                    self.log_message("Force cleanup: a command was still in flight after the timeout", level="WARNING")
+                self.log_message("Force cleanup completed")
+                messagebox.showinfo("Cleanup", "All instances and threads have been force cleaned")
+                if on_done:
+                    on_done()
+            except Exception as e:
+                self.log_message(f"Error during force cleanup: {e}", level="ERROR")
+                messagebox.showerror("Error", f"Force cleanup failed: {e}")
+               
+        try:
+            # Stop all automation; the dispatcher finishes an in-flight command in the background
+            running = [name for name, instance in self.instances.items() if instance.running]
+            self.when_done(self.stop_instances_async(running), finished)
            
         except Exception as e:
-            self.log_message(f"Error during force cleanup: {e}")
+            self.log_message(f"Error during force cleanup: {e}", level="ERROR")
             messagebox.showerror("Error", f"Force cleanup failed: {e}")
            
     def reset_all_instances(self):
@@ -550,28 +3507,31 @@ class MudaeMultiAutomation:
         if messagebox.askyesno("Reset All",
                               "This will DELETE ALL instances and reset everything.\n"
                               "This cannot be undone. Are you sure?"):
-            try:
-                # Stop everything
-                self.force_cleanup_all()
-               
-                # Clear all data
-                self.instances.clear()
-                self.automation_threads.clear()
-               
-                # Update displays
-                self.refresh_instance_list()
-                self.refresh_control_combo()
-               
-                # Delete config file
-                if os.path.exists(self.config_file):
-                    os.remove(self.config_file)
-                   
-                self.log_message("All instances reset - starting fresh")
-                messagebox.showinfo("Reset Complete", "All instances have been deleted")
+            # Stop everything, then clear once nothing is mid-command
+            self.force_cleanup_all(on_done=self.clear_all_instances)
+           
+    def clear_all_instances(self):
+        """Delete every instance along with the config and schedule state files"""
+        try:
+            # Clear all data
+            self.instances.clear()
+           
+            # Update displays
+            self.refresh_instance_list()
+            self.refresh_control_combo()
+           
+            # Delete config and schedule state files
+            if os.path.exists(self.config_file):
+                os.remove(self.config_file)
+            if self.state_store:
+                self.state_store.clear()
                
-            except Exception as e:
-                self.log_message(f"Error during reset: {e}")
-                messagebox.showerror("Reset Error", f"Error during reset: {e}")
+            self.log_message("All instances reset - starting fresh")
+            messagebox.showinfo("Reset Complete", "All instances have been deleted")
+           
+        except Exception as e:
+            self.log_message(f"Error during reset: {e}", level="ERROR")
+            messagebox.showerror("Reset Error", f"Error during reset: {e}")
            
     def test_region(self):
         """Test selected instance's chat region with visual feedback"""
@@ -580,8 +3540,7 @@ class MudaeMultiAutomation:
             messagebox.showwarning("Warning", "Please select an instance to test")
             return
            
-        item = self.instance_tree.item(selection[0])
-        instance_name = item['values'][0]
+        instance_name = selection[0]  # Rows use the instance name as their item id
         instance = self.instances[instance_name]
        
         if not instance.chat_region:
@@ -621,178 +3580,8 @@ class MudaeMultiAutomation:
             preview.after(3000, preview.destroy)
            
         except Exception as e:
-            self.log_message(f"Error showing click preview: {e}")
-       
-    def validate_region(self, region):
-        """Validate if region is within screen bounds"""
-        try:
-            screen_width, screen_height = pyautogui.size()
-            x, y, w, h = region
-            center_x = x + w // 2
-            center_y = y + h // 2
-            if 0 <= center_x < screen_width and 0 <= center_y < screen_height:
-                return True
-            return False
-        except Exception as e:
-            self.log_message(f"Error validating region: {e}")
-            return False
-       
-    def send_command_to_instance(self, instance, command):
-        """Send a command to a specific instance with retry"""
-        with self.pyautogui_lock:  # Lock to prevent concurrent PyAutoGUI usage
-            for attempt in range(1, self.retry_attempts + 1):
-                try:
-                    if not self.validate_region(instance.chat_region):
-                        self.log_message(f"[{instance.name}] Invalid chat region")
-                        return False
-                   
-                    center_x = instance.chat_region[0] + instance.chat_region[2] // 2
-                    center_y = instance.chat_region[1] + instance.chat_region[3] // 2
-                    pyautogui.click(center_x, center_y)
-                    time.sleep(self.command_delay)
-                    pyautogui.typewrite(command)
-                    time.sleep(self.command_delay)
-                    pyautogui.press('enter')
-                   
-                    self.log_message(f"[{instance.name}] Sent command: {command} (attempt {attempt})")
-                   
-                    # Optional: Verify command success (uncomment if pytesseract installed)
-                    # if self.verify_command(instance, command):
-                    #     return True
-                   
-                    return True
-               
-                except Exception as e:
-                    self.log_message(f"[{instance.name}] Error sending command {command} (attempt {attempt}): {e}")
-                    if attempt < self.retry_attempts:
-                        time.sleep(1)  # Wait before retry
-           
-            self.log_message(f"[{instance.name}] Failed to send command {command} after {self.retry_attempts} attempts")
-            return False
-           
-    def verify_command(self, instance, command):
-        """Verify if command was successful by capturing and analyzing chat region (requires pytesseract)"""
-        try:
-            import pytesseract  # Requires pip install pytesseract and Tesseract OCR installed
-            x, y, w, h = instance.chat_region
-            screenshot = pyautogui.screenshot(region=(x, y, w, h))
-            text = pytesseract.image_to_string(screenshot)
-           
-            # Check for expected response (customize based on Mudae bot responses)
-            if "rolled" in text.lower() or "claimed" in text.lower():  # Example keywords
-                self.log_message(f"[{instance.name}] Command {command} verified successfully")
-                return True
-            else:
-                self.log_message(f"[{instance.name}] Command {command} verification failed (no expected response)")
-                return False
-           
-        except ImportError:
-            self.log_message("pytesseract not installed; skipping verification")
-            return True  # Assume success if not installed
-        except Exception as e:
-            self.log_message(f"[{instance.name}] Error verifying command {command}: {e}")
-            return False
-           
-    def automation_loop(self, instance_name):
-        """Main automation loop for an instance with dynamic sleep"""
-        instance = self.instances[instance_name]
+            self.log_message(f"Error showing click preview: {e}", level="ERROR")
        
-        while instance.running:
-            if instance.paused:
-                time.sleep(1)
-                continue
-               
-            current_time = time.time()
-           
-            next_w = max(0, instance.w_interval - (current_time - instance.last_w_time))
-            next_rolls = max(0, instance.rolls_interval - (current_time - instance.last_rolls_time))
-           
-            # Send commands if time is up
-            if next_w <= 0:
-                if self.send_command_to_instance(instance, ".w"):
-                    instance.last_w_time = current_time
-                    time.sleep(random.uniform(1, 3))
-                   
-            if next_rolls <= 0:
-                if self.send_command_to_instance(instance, ".rolls"):
-                    instance.last_rolls_time = current_time
-                    time.sleep(random.uniform(1, 3))
-           
-            # Dynamic sleep: Sleep until the next command or max 5 seconds
-            sleep_time = min(next_w, next_rolls, 5)
-            time.sleep(sleep_time if sleep_time > 0 else 1)
-           
-        # Clean up thread reference when done
-        if instance_name in self.automation_threads:
-            del self.automation_threads[instance_name]
-           
-    def start_instance(self, instance_name):
-        """Start automation for a specific instance"""
-        if instance_name not in self.instances:
-            return
-           
-        instance = self.instances[instance_name]
-        instance.running = True
-        instance.paused = False
-       
-        # Start automation thread
-        thread = threading.Thread(target=self.automation_loop, args=(instance_name,), daemon=True)
-        self.automation_threads[instance_name] = thread
-        thread.start()
-       
-        self.log_message(f"Started automation for: {instance_name}")
-        self.refresh_instance_list()
-        self.update_status_display()
-       
-    def pause_instance(self, instance_name):
-        """Pause automation for a specific instance"""
-        if instance_name in self.instances:
-            instance = self.instances[instance_name]
-            instance.paused = not instance.paused
-            status = "paused" if instance.paused else "resumed"
-            self.log_message(f"{instance_name} automation {status}")
-            self.refresh_instance_list()
-            self.update_status_display()
-           
-    def stop_instance(self, instance_name):
-        """Stop automation for a specific instance with error handling"""
-        try:
-            if instance_name in self.instances:
-                instance = self.instances[instance_name]
-                instance.running = False
-                instance.paused = False
-               
-                # Wait for thread to stop gracefully
-                if instance_name in self.automation_threads:
-                    thread = self.automation_threads[instance_name]
-                    thread.join(timeout=2)  # Wait up to 2 seconds
-                    if thread.is_alive():
-                        self.log_message(f"Warning: Thread for {instance_name} did not stop gracefully")
-                    del self.automation_threads[instance_name]
-                   
-                self.log_message(f"Stopped automation for: {instance_name}")
-                self.refresh_instance_list()
-                self.update_status_display()
-        except Exception as e:
-            self.log_message(f"Error stopping {instance_name}: {e}")
-           
-    def start_all_instances(self):
-        """Start all instances"""
-        for name in list(self.instances.keys()):
-            if not self.instances[name].running:
-                self.start_instance(name)
-               
-    def pause_all_instances(self):
-        """Pause all running instances"""
-        for name in self.instances:
-            if self.instances[name].running:
-                self.pause_instance(name)
-               
-    def stop_all_instances(self):
-        """Stop all instances"""
-        for name in list(self.instances.keys()):
-            self.stop_instance(name)
-           
     def start_selected_instance(self):
         """Start selected instance from control panel"""
         instance_name = self.control_instance_var.get()
@@ -811,109 +3600,237 @@ class MudaeMultiAutomation:
         if instance_name:
             self.stop_instance(instance_name)
            
+    def start_selected_group(self):
+        """Start every instance of the selected group"""
+        if self.group_var.get():
+            self.start_instances(tag=self.group_var.get())
+           
+    def pause_selected_group(self):
+        """Pause (or resume) every running instance of the selected group"""
+        if self.group_var.get():
+            self.pause_instances(tag=self.group_var.get())
+           
+    def stop_selected_group(self):
+        """Stop every instance of the selected group"""
+        if self.group_var.get():
+            self.stop_instances(tag=self.group_var.get())
+           
     def update_status_display(self):
-        """Update the status display in control panel"""
+        """Update the status display in control panel and schedule the next update"""
+        self.render_status_display()
+       
+        # Schedule next update, keeping a single timer however often this is called
+        if self.status_timer is not None:
+            self.root.after_cancel(self.status_timer)
+        self.status_timer = self.root.after(5000, self.update_status_display)
+       
+    def render_status_display(self, names=None):
+        """Redraw the status display (or only the given instances), patching only changed fields"""
         self.status_text.config(state=tk.NORMAL)
-        self.status_text.delete(1.0, tk.END)
        
-        for name, instance in self.instances.items():
-            status = "Stopped"
-            if instance.running:
-                status = "Paused" if instance.paused else "Running"
-               
-            next_w = max(0, int(instance.w_interval - (time.time() - instance.last_w_time)))
-            next_rolls = max(0, int(instance.rolls_interval - (time.time() - instance.last_rolls_time)))
+        # Drop blocks of deleted instances
+        for name in list(self.status_blocks):
+            if name not in self.instances:
+                block_tag, _ = self.status_blocks.pop(name)
+                ranges = self.status_text.tag_ranges(block_tag)
+                if ranges:
+                    self.status_text.delete(ranges[0], ranges[-1])
+                   
+        current_time = self.clock.monotonic()
+        names = self.instances if names is None else [name for name in names if name in self.instances]
+        for name in names:
+            instance = self.instances[name]
+            fields = {
+                'status': instance.status,
+                'next': ", ".join(f"{command} in {int(instance.seconds_until(command, current_time))}s"
+                                  for command in instance.commands()),
+                'region': str(instance.chat_region),
+                'lock': self.lock_summary(name),
+                'verify': f"{instance.verify_mode} (OCR {instance.ocr_runs} run / {instance.ocr_skipped} skipped)",
+                'health': instance.breaker.describe(current_time),
+            }
            
-            self.status_text.insert(tk.END, f"{name}:\n")
-            self.status_text.insert(tk.END, f" Status: {status}\n")
-            self.status_text.insert(tk.END, f" Next $w in: {next_w} seconds\n")
-            self.status_text.insert(tk.END, f" Next $rolls in: {next_rolls} seconds\n")
-            self.status_text.insert(tk.END, f" Region: {instance.chat_region}\n\n")
+            if name not in self.status_blocks:
+                self.insert_status_block(name, fields)
+                continue
+               
+            block_tag, shown = self.status_blocks[name]
+            for field, value in fields.items():
+                if shown[field] != value:
+                    field_tag = f"{block_tag}.{field}"
+                    start, end = self.status_text.tag_ranges(field_tag)
+                    self.status_text.delete(start, end)
+                    self.status_text.insert(start, value, (field_tag, block_tag))
+                    shown[field] = value
            
         self.status_text.config(state=tk.DISABLED)
+        self.refresh_metrics_view()
+       
+    def lock_summary(self, instance_name):
+        """p50/p95 input lock hold time of an instance"""
+        hold = self.metrics.histogram('lock_hold_seconds', instance_name)
+        if hold is None:
+            return "no commands yet"
+        return f"hold p50 {hold.percentile(0.5) * 1000:g} ms / p95 {hold.percentile(0.95) * 1000:g} ms"
+   
+    def insert_status_block(self, name, fields):
+        """Append the status block of an instance, tagging each field for later patches"""
+        block_tag = f"block{next(self.status_block_ids)}"
+        layout = [
+            f"{name}:\n Status: ", 'status',
+            "\n Next: ", 'next',
+            "\n Region: ", 'region',
+            "\n Input lock: ", 'lock',
+            "\n Verify: ", 'verify',
+            "\n Health: ", 'health',
+            "\n\n",
+        ]
+        for part in layout:
+            if part in fields:
+                self.status_text.insert(tk.END, fields[part], (f"{block_tag}.{part}", block_tag))
+            else:
+                self.status_text.insert(tk.END, part, (block_tag,))
+        self.status_blocks[name] = (block_tag, dict(fields))
        
-        # Schedule next update
-        self.root.after(5000, self.update_status_display)
-       
-    def save_instances(self):
-        """Save instances to file"""
-        try:
-            data = {name: instance.to_dict() for name, instance in self.instances.items()}
-            with open(self.config_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            self.log_message(f"Error saving instances: {e}")
-            messagebox.showerror("Error", f"Failed to save instances: {e}")
+    def display_log(self, timestamp, message, level="INFO", instance=None):
+        """Queue a log line for the Logs tab; safe to call from any thread"""
+        self.ui_events.log((timestamp, message, level, instance))
            
-    def load_instances(self):
-        """Load instances from file"""
+    def on_instances_changed(self):
+        """Refresh every view of the instances on the next UI frame"""
+        self.ui_events.mark('instances')
+       
+    def on_instance_updated(self, instance_name):
+        self.ui_events.mark('status', instance_name)
+       
+    def pump_ui_events(self):
+        """Apply queued worker events to the widgets, then schedule the next frame"""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    data = json.load(f)
-                   
-                for name, instance_data in data.items():
-                    self.instances[name] = MudaeInstance.from_dict(instance_data)
-                   
-                self.log_message(f"Loaded {len(self.instances)} instances from config")
+            lines, dirty = self.ui_events.drain()
+            if lines:
+                for line in lines:
+                    self.log_model.append(*line)
+                self.log_view.refresh()
+            if 'instances' in dirty:
                 self.refresh_instance_list()
                 self.refresh_control_combo()
+                self.render_status_display()
+            elif 'status' in dirty:
+                self.render_status_display(dirty['status'])
         except Exception as e:
-            self.log_message(f"Error loading instances: {e}")
-            messagebox.showerror("Error", f"Failed to load instances: {e}")
-           
-    def log_message(self, message):
-        """Add message to log with full timestamp and save to file"""
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-       
-        # Check if GUI is initialized
-        if hasattr(self, 'log_text') and self.log_text:
-            try:
-                self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-                self.log_text.see(tk.END)
-                self.root.update()
-            except:
-                print(f"[{timestamp}] {message}")
-        else:
-            print(f"[{timestamp}] {message}")
+            print(f"Error updating the GUI: {e}")
+        self.root.after(self.UI_FRAME_MS, self.pump_ui_events)
        
-        # Save to file
-        try:
-            with open("mudae_log.txt", "a") as f:
-                f.write(f"[{timestamp}] {message}\n")
-        except Exception as e:
-            print(f"Error saving log: {e}")
+    def report_error(self, title, message):
+        messagebox.showerror(title, message)
        
     def clear_log(self):
         """Clear the log"""
-        self.log_text.delete(1.0, tk.END)
+        self.log_model.clear()
+        self.apply_log_filters()
+       
+    def apply_log_filters(self):
+        """Show only the log lines of the chosen instance/level that contain the search text"""
+        instance = self.log_instance_var.get()
+        level = self.log_level_var.get()
+        self.log_view.set_filters(None if instance == "All" else instance, None if level == "All" else level,
+                                  self.log_search_var.get().strip())
        
     def run(self):
         """Run the GUI"""
         try:
-            # Start status update loop
+            # Start the worker event pump and the status update loop
+            self.pump_ui_events()
             self.update_status_display()
             self.root.mainloop()
         except KeyboardInterrupt:
             self.stop_all_instances()
         except Exception as e:
-            self.log_message(f"GUI error: {e}")
+            self.log_message(f"GUI error: {e}", level="ERROR")
             messagebox.showerror("Error", f"Application error: {e}")
            
 if __name__ == "__main__":
-    # Install required packages if not present (informational)
-    try:
-        import pyautogui
-        import cv2
-        import numpy as np
-        from PIL import Image, ImageTk
-    except ImportError as e:
-        print(f"Missing required package: {e}")
+    STARTUP.mark("module import")
+    import argparse
+    parser = argparse.ArgumentParser(description="Mudae Multi-Instance Automation")
+    parser.add_argument("--benchmark-capture", metavar="BACKEND", choices=sorted(CAPTURE_BACKENDS),
+                        help="Benchmark a capture backend and exit")
+    parser.add_argument("--frames", type=int, default=200, help="Frames to capture when benchmarking")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Simulate fleets on a virtual clock with a fake input device and exit")
+    parser.add_argument("--instances", default="1,10,100,500", help="Comma-separated fleet sizes to simulate")
+    parser.add_argument("--days", type=float, default=1.0, help="Simulated days per fleet size")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run the instances from the config file without the GUI")
+    parser.add_argument("--config", default="mudae_instances.json", help="Instance config file for --headless")
+    parser.add_argument("--only", help="Comma-separated instance names to run with --headless (default: all)")
+    parser.add_argument("--tag", help="Only run the instances with this group tag with --headless")
+    parser.add_argument("--displays", help="Comma-separated X displays (e.g. :1,:2) to shard --headless across, "
+                                           "one worker process each")
+    parser.add_argument("--log-file", default="mudae_log.txt", help="Log file for --headless")
+    parser.add_argument("--quiet", action="store_true", help="Do not echo the log to stdout with --headless")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Print how long imports, GUI construction and config loading took")
+    parser.add_argument("--record", metavar="DIR",
+                        help="Record verification frames and the command timeline to DIR (turns verification on)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Trace the send path with --headless and write a Chrome trace to FILE on exit")
+    parser.add_argument("--detect-regions", metavar="IMAGE",
+                        help="Detect Discord chat boxes in a screenshot ('synthetic' for a generated one) and exit")
+    parser.add_argument("--replay", metavar="DIR", help="Replay a recorded session through the verifier and exit")
+    parser.add_argument("--replay-mode", choices=VERIFY_MODES,
+                        help="Verify replayed frames with this mode instead of the recorded one")
+    args = parser.parse_args()
+    if args.displays and (args.record or args.trace):
+        parser.error("--record and --trace cannot be combined with --displays")
+   
+    if args.benchmark_capture:
+        print(json.dumps(benchmark_capture(create_capture_backend(args.benchmark_capture), frames=args.frames)))
+        exit(0)
+       
+    if args.benchmark:
+        for count in [int(value) for value in args.instances.split(",")]:
+            print(json.dumps(run_scaling_benchmark(count, days=args.days)))
+        exit(0)
+       
+    if args.replay:
+        print(json.dumps(run_replay(args.replay, args.replay_mode)))
+        exit(0)
+       
+    if args.detect_regions:
+        expected = None
+        if args.detect_regions == "synthetic":
+            screenshot, expected = synthetic_desktop()
+        else:
+            screenshot = cv2.imread(args.detect_regions)
+            if screenshot is None:
+                print(f"Cannot read image {args.detect_regions}")
+                exit(1)
+            screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2RGB)
+        detector = ChatRegionDetector()
+        started = time.perf_counter()
+        found = detector.detect(screenshot)
+        report = {'regions': found, 'seconds': round(time.perf_counter() - started, 3)}
+        if expected is not None:
+            report['expected'] = expected
+            report['all_found'] = all(any(max(abs(a - b) for a, b in zip(region, match)) <= 3 for match in found)
+                                      for region in expected)
+        print(json.dumps(report))
+        exit(0)
+       
+    # Install required packages if not present (informational); found without importing them
+    if importlib.util.find_spec("pyautogui") is None:
+        print("Missing required package: pyautogui")
         print("Please install with: pip install opencv-python pyautogui pillow numpy")
         exit(1)
        
+    # The vision stack is only imported once verification or capture is used
+    for package in ("cv2", "numpy"):
+        if importlib.util.find_spec(package) is None:
+            print(f"Optional package {package} not installed; capture and verification are unavailable")
+           
     # OS-specific instructions
-    # Configure pyautogui safety
+    # Configure pyautogui safety (applied when it is first used)
     pyautogui.FAILSAFE = True  # Move mouse to corner to stop
     pyautogui.PAUSE = 0.1  # Small pause between actions
    
@@ -924,5 +3841,30 @@ if __name__ == "__main__":
     print("Move mouse to top-left corner for emergency stop")
     print()
    
+    if args.headless and args.displays:
+        coordinator = ShardCoordinator(args.displays.split(","), args.config, log_file=args.log_file,
+                                       echo_log=not args.quiet)
+        exit(0 if coordinator.run(args.only.split(",") if args.only else None, args.tag) else 1)
+       
+    if args.headless:
+        runner = HeadlessAutomation(args.config, log_file=args.log_file, echo_log=not args.quiet)
+        if args.record:
+            runner.recorder = SessionRecorder(args.record)
+            runner.verify_enabled = True
+        if args.trace:
+            runner.tracer.enabled = True
+        if args.startup_profile:
+            print(STARTUP.report())
+        ok = runner.run(args.only.split(",") if args.only else None, args.tag)
+        if args.trace:
+            print(f"Wrote {runner.tracer.export(args.trace)} spans to {args.trace}")
+        exit(0 if ok else 1)
+       
     app = MudaeMultiAutomation()
+    if args.record:
+        app.recorder = SessionRecorder(args.record)
+        app.verify_enabled = True
+        app.verify_var.set(True)
+    if args.startup_profile:
+        print(STARTUP.report())
     app.run()
\ No newline at end of file
@@ -0,0 +1,34 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Mudae Automation using cv2.py")
+
+
+def load_script():
+    """Import the automation script (its file name is not a valid module name)"""
+    spec = importlib.util.spec_from_file_location("mudae_automation", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def mudae():
+    return load_script()
+
+
+@pytest.fixture
+def make_engine(mudae):
+    """Build an engine on a virtual clock with a recording input device and no files"""
+    def make(**settings):
+        clock = mudae.VirtualClock()
+        engine = mudae.AutomationEngine(clock=clock, input_backend=mudae.RecordingInput(clock=clock.monotonic),
+                                        log_file=None, echo_log=False, seed=0, state_file=None)
+        for name, value in settings.items():
+            setattr(engine, name, value)
+        return engine
+    return make
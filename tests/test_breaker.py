@@ -0,0 +1,64 @@
+def test_trips_after_consecutive_failures(mudae):
+    breaker = mudae.CircuitBreaker(failure_threshold=3, base_backoff=30)
+    assert breaker.record(False, 0) is None
+    assert breaker.record(False, 1) is None
+    assert breaker.record(False, 2) == mudae.CircuitBreaker.OPEN
+    assert breaker.open_until == 32
+    assert not breaker.allow(31)
+
+
+def test_success_clears_failures(mudae):
+    breaker = mudae.CircuitBreaker(failure_threshold=3)
+    breaker.record(False, 0)
+    breaker.record(False, 0)
+    breaker.record(True, 0)
+    assert breaker.record(False, 0) is None
+    assert breaker.state == mudae.CircuitBreaker.CLOSED
+
+
+def test_failed_probe_doubles_the_backoff(mudae):
+    breaker = mudae.CircuitBreaker(failure_threshold=1, base_backoff=30, max_backoff=100)
+    breaker.record(False, 0)
+    assert breaker.allow(30) and breaker.state == mudae.CircuitBreaker.HALF_OPEN
+    assert breaker.record(False, 30) == mudae.CircuitBreaker.OPEN
+    assert breaker.open_until == 90
+    breaker.allow(90)
+    breaker.record(False, 90)
+    assert breaker.open_until == 190  # Capped at max_backoff
+
+
+def test_successful_probe_recovers(mudae):
+    breaker = mudae.CircuitBreaker(failure_threshold=1, base_backoff=30)
+    breaker.record(False, 0)
+    breaker.allow(30)
+    assert breaker.record(True, 30) == mudae.CircuitBreaker.CLOSED
+    assert breaker.trips == 0 and breaker.describe(30) == "ok"
+
+
+def test_failed_verifications_quarantine_the_instance(mudae, make_engine):
+    engine = make_engine(verify_enabled=True)
+    engine.capture_backend = mudae.FakeCapture(size=(200, 200))
+    engine.analyze_frame = lambda instance, frame: False
+    instance = mudae.MudaeInstance("a", (0, 0, 64, 48), 3600, 180)
+    engine.instances["a"] = instance
+    instance.running = True
+
+    for _ in range(3):
+        assert engine.verify_command(instance, [".w"]) is False
+    assert instance.breaker.state == mudae.CircuitBreaker.OPEN
+    assert engine.metrics.counter('quarantines', "a") == 1
+
+
+def test_sends_alone_do_not_clear_failures_when_verifying(mudae, make_engine):
+    engine = make_engine(verify_enabled=True, verify_delay=3600)
+    engine.verification_pool = mudae.VerificationPool(workers=1)
+    instance = mudae.MudaeInstance("a", (100, 100, 600, 80), 3600, 180)
+    engine.instances["a"] = instance
+    try:
+        engine.start_instance("a")
+        instance.breaker.record(False, 0)
+        engine.run_until(engine.clock.monotonic() + 1)
+        assert engine.metrics.counter('commands_sent', "a") == 2
+        assert instance.breaker.failures == 1  # Sent fine, but the verdict is still pending
+    finally:
+        engine.verification_pool.close()
@@ -0,0 +1,84 @@
+import threading
+
+import numpy as np
+import pytest
+
+
+def test_backend_must_implement_grab(mudae):
+    with pytest.raises(TypeError):
+        mudae.CaptureBackend()
+
+
+def test_capture_reuses_the_region_buffer_on_one_thread(mudae):
+    backend = mudae.FakeCapture(size=(200, 300))
+    first = backend.capture((10, 20, 50, 40))
+    assert first is backend.capture((10, 20, 50, 40))
+    assert np.array_equal(first, backend.desktop[20:60, 10:60])
+    assert backend.stats()['frames'] == 2
+    assert backend.stats()['allocations_per_frame'] == 0.5
+
+
+def test_threads_capturing_one_region_get_separate_buffers(mudae):
+    backend = mudae.FakeCapture(size=(200, 300))
+    frames = []
+    threads = [threading.Thread(target=lambda: frames.append(backend.capture((0, 0, 64, 32)))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert frames[0] is not frames[1]
+
+
+def test_shared_capture_reuses_its_storage_as_the_union_changes(mudae):
+    backend = mudae.FakeCapture(size=(400, 600))
+    active = [(0, 0, 300, 200), (300, 200, 300, 200)]
+    shared = mudae.SharedDesktopCapture(backend, lambda: active, max_gather=0)
+
+    for region in [(10, 10, 50, 40), (320, 220, 50, 40)]:
+        view = shared.acquire(region)
+        x, y, w, h = region
+        assert np.array_equal(view, backend.desktop[y:y + h, x:x + w])
+        shared.release()
+    active[:] = [(0, 0, 100, 100)]  # An instance moved or was removed: the union shrinks
+    view = shared.acquire((20, 30, 40, 20))
+    assert np.array_equal(view, backend.desktop[30:50, 20:60])
+    shared.release()
+
+    assert backend.stats()['frames'] == 3
+    assert backend.allocations == 1
+
+
+def test_chat_regions_are_detected_on_every_monitor(mudae, make_engine):
+    desktop, expected = mudae.synthetic_desktop(seed=1)
+    engine = make_engine()
+    engine.capture_backend = mudae.FakeCapture(desktop, origin=(-1920, 0))  # Second monitor left of the primary
+
+    regions = engine.detect_chat_regions()
+    assert len(regions) == len(expected)
+    assert regions == [(x - 1920, y, w, h) for x, y, w, h in engine.detect_chat_regions(desktop)]
+    assert min(x for x, _, _, _ in regions) < 0
+    for x, y, w, h in regions:
+        assert np.array_equal(engine.capture_backend.capture((x, y, w, h)), desktop[y:y + h, x + 1920:x + 1920 + w])
+    assert len(engine.capture_backend.local.buffers) == len(regions)  # The desktop grab was not cached
+
+
+def test_regions_the_input_device_cannot_reach_get_no_instance(mudae, make_engine):
+    desktop, _ = mudae.synthetic_desktop(seed=1)
+    engine = make_engine()
+    engine.capture_backend = mudae.FakeCapture(desktop, origin=(-1920, 0))
+    regions = engine.detect_chat_regions()
+    on_primary = [region for region in regions if region[0] >= 0]
+    assert on_primary and len(on_primary) < len(regions)
+
+    names = engine.create_instances_for_regions(regions)
+    assert sorted(engine.instances[name].chat_region for name in names) == sorted(list(r) for r in on_primary)
+
+
+def test_template_loaders_share_one_reader(mudae, tmp_path):
+    image = np.full((20, 30), 128, dtype=np.uint8)
+    mudae.cv2.imwrite(str(tmp_path / "embed.png"), image)
+    (tmp_path / "notes.txt").write_text("not an image")
+
+    assert [name for name, _ in mudae.TemplateVerifier(str(tmp_path)).templates] == ["embed"]
+    assert [name for name, _ in mudae.ChatRegionDetector(str(tmp_path)).templates] == ["embed"]
+    assert [name for name, _ in mudae.ChatRegionDetector(str(tmp_path / "missing")).templates] == ["builtin"]
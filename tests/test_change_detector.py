@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def chat_frame(mudae, lines, size=(600, 800)):
+    """A dark chat region with one line of text per entry"""
+    frame = np.full((*size, 3), mudae.CHAT_BACKGROUND, dtype=np.uint8)
+    for row, text in enumerate(lines):
+        mudae.cv2.putText(frame, text, (20, 40 + 22 * row), mudae.cv2.FONT_HERSHEY_SIMPLEX, 0.45,
+                          (219, 222, 225), 1, mudae.cv2.LINE_AA)
+    return frame
+
+
+def test_first_frame_counts_as_changed(mudae):
+    assert mudae.FrameChangeDetector().changed(chat_frame(mudae, ["user: $w"]))
+
+
+def test_identical_frame_is_unchanged(mudae):
+    detector = mudae.FrameChangeDetector()
+    detector.changed(chat_frame(mudae, ["user: $w"]))
+    assert not detector.changed(chat_frame(mudae, ["user: $w"]))
+
+
+def test_one_new_chat_line_in_a_large_region_is_a_change(mudae):
+    detector = mudae.FrameChangeDetector()
+    detector.changed(chat_frame(mudae, ["user: $w"] * 5))
+    assert detector.changed(chat_frame(mudae, ["user: $w"] * 5 + ["Mudae: rolled"]))
+
+
+def test_single_pixel_noise_is_ignored(mudae):
+    detector = mudae.FrameChangeDetector()
+    frame = chat_frame(mudae, ["user: $w"])
+    detector.changed(frame)
+    noisy = frame.copy()
+    noisy[300, 400] = (255, 255, 255)
+    assert not detector.changed(noisy)
+
+
+def test_unchanged_region_fails_verification_without_ocr(mudae, make_engine):
+    engine = make_engine()
+    instance = mudae.MudaeInstance("a", (0, 0, 800, 600), 3600, 180)
+    frame = chat_frame(mudae, ["user: $w"])
+    instance.change_detector.changed(frame)  # Analysed (and verified) after an earlier command
+
+    assert engine.analyze_frame(instance, frame) is False
+    assert instance.ocr_skipped == 1 and instance.ocr_runs == 0
@@ -0,0 +1,19 @@
+import pytest
+
+
+def test_backend_must_implement_type_text(mudae):
+    class ClickOnly(mudae.InputBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        ClickOnly()
+
+
+def test_recording_input_records_in_order(mudae):
+    clock = mudae.VirtualClock()
+    device = mudae.RecordingInput(clock=clock.monotonic)
+    device.click(10, 20)
+    clock.sleep(0.2)
+    device.type_text(".w")
+    device.press('enter')
+    assert list(device.events) == [(1000.0, 'click', (10, 20)), (1000.2, 'type', ".w"), (1000.2, 'press', 'enter')]
@@ -0,0 +1,35 @@
+import json
+
+
+def test_log_model_filters_on_the_given_level_and_instance(mudae):
+    model = mudae.LogModel(capacity=3)
+    model.append("t0", "[alt] Sent command: .w", "INFO", "alt")
+    model.append("t1", "[a]b] Error handling was fine", "INFO", "a]b")
+    model.append("t2", "[a]b] Command .w verification failed (no expected response)", "WARNING", "a]b")
+
+    assert len(model.query(instance="a]b")) == 2
+    assert model.query(level="ERROR") == []
+    assert [model.entry(seq)[3] for seq in model.query(level="WARNING")] == \
+        ["[a]b] Command .w verification failed (no expected response)"]
+
+    model.append("t3", "Settings saved successfully")  # Evicts the oldest line
+    assert model.query(instance="alt") == []
+    assert model.entry(model.query(instance=None, level="INFO")[-1])[1] is None
+
+
+def test_engine_passes_level_and_instance_through(mudae, make_engine):
+    engine = make_engine()
+    lines = []
+    engine.display_log = lambda timestamp, message, level, instance: lines.append((message, level, instance))
+    engine.log_message("Invalid chat region", level="ERROR", instance="a]b")
+    engine.log_message("Settings saved successfully")
+    assert lines == [("[a]b] Invalid chat region", "ERROR", "a]b"), ("Settings saved successfully", "INFO", None)]
+
+
+def test_structured_log_records_level_and_instance(mudae, tmp_path):
+    writer = mudae.LogWriter(str(tmp_path / "log.txt"), structured=True)
+    writer.write("[a] Quarantined", "WARNING", "a")
+    writer.close()
+    with open(tmp_path / "log.jsonl", encoding="utf-8") as f:
+        record = json.loads(f.readline())
+    assert (record['level'], record['instance'], record['message']) == ("WARNING", "a", "[a] Quarantined")
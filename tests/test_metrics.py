@@ -0,0 +1,31 @@
+import json
+import threading
+import time
+
+
+def exporter_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "metrics-export"]
+
+
+def test_restarting_the_export_leaves_one_exporter(mudae, tmp_path):
+    metrics = mudae.MetricsRegistry()
+    metrics.inc('commands_sent', "a")
+    for fmt in ("prometheus", "json", "prometheus", "json"):
+        metrics.start_periodic_export(str(tmp_path / "metrics"), fmt, interval=0.01)
+    time.sleep(0.1)
+    assert len(exporter_threads()) == 1
+    assert json.loads((tmp_path / "metrics").read_text())['instances'] == {"a": {'commands_sent': 1}}
+
+    metrics.stop_periodic_export()
+    assert exporter_threads() == []
+
+
+def test_prometheus_histogram_is_cumulative(mudae):
+    metrics = mudae.MetricsRegistry()
+    for seconds in (0.002, 0.02, 3):
+        metrics.observe('send_latency_seconds', "a", seconds)
+    lines = metrics.to_prometheus().splitlines()
+    assert 'mudae_send_latency_seconds_bucket{instance="a",le="0.0025"} 1' in lines
+    assert 'mudae_send_latency_seconds_bucket{instance="a",le="0.025"} 2' in lines
+    assert 'mudae_send_latency_seconds_bucket{instance="a",le="+Inf"} 3' in lines
+    assert 'mudae_send_latency_seconds_count{instance="a"} 3' in lines
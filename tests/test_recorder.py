@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+
+def chat_frames(mudae, count, size=(600, 800)):
+    """A chat region that gains one line per frame"""
+    frame = np.full((*size, 3), mudae.CHAT_BACKGROUND, dtype=np.uint8)
+    for row in range(count):
+        mudae.cv2.putText(frame, f"Mudae: roll {row}", (20, 40 + 22 * row), mudae.cv2.FONT_HERSHEY_SIMPLEX,
+                          0.45, (219, 222, 225), 1, mudae.cv2.LINE_AA)
+        yield frame.copy()
+
+
+def replayed(directory, mudae):
+    return [(event, frame.copy()) for event, frame in mudae.iter_session_frames(directory)]
+
+
+def test_recorded_frames_replay_exactly(mudae, tmp_path):
+    recorder = mudae.SessionRecorder(str(tmp_path), clock=mudae.VirtualClock())
+    recorder.CHUNK_FRAMES = 4
+    frames = list(chat_frames(mudae, 6))
+    frames.insert(3, frames[2])  # A repeated picture
+    frames.append(np.zeros((40, 50, 3), dtype=np.uint8))  # The region was resized
+    recorder.command("a", ".w", 1, True)
+    for index, frame in enumerate(frames):
+        recorder.frame("a", frame, "ocr", index % 2 == 0)
+    recorder.close()
+
+    replay = replayed(str(tmp_path), mudae)
+    assert len(replay) == len(frames)
+    for (event, frame), original in zip(replay, frames):
+        assert np.array_equal(frame, original)
+    assert [event['verified'] for event, _ in replay] == [index % 2 == 0 for index in range(len(frames))]
+    assert replay[3][0]['offset'] == replay[2][0]['offset']
+    assert len({event['chunk'] for event, _ in replay}) == 3  # Four frames, then three, then the new size
+
+
+def test_recording_is_compressed(mudae, tmp_path):
+    recorder = mudae.SessionRecorder(str(tmp_path), clock=mudae.VirtualClock())
+    for frame in chat_frames(mudae, 10):
+        recorder.frame("a", frame, "ocr", True)
+    recorder.close()
+
+    size = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    assert size < 10 * 600 * 800 * 3 / 100
+
+
+def test_session_replays_without_close(mudae, tmp_path, monkeypatch):
+    recorder = mudae.SessionRecorder(str(tmp_path), clock=mudae.VirtualClock())
+    frames = list(chat_frames(mudae, 3))
+    recorder.command("a", ".w", 1, True)
+    for frame in frames:
+        recorder.frame("a", frame, "ocr", True)
+    # No close(): as after a crash, every timeline entry must already point at data on disk
+    with open(tmp_path / "timeline.jsonl", "a", encoding="utf-8") as timeline:
+        timeline.write('{"t": 1.0, "type": "fra')
+
+    replay = replayed(str(tmp_path), mudae)
+    assert [np.array_equal(frame, original) for (_, frame), original in zip(replay, frames)] == [True] * 3
+    monkeypatch.setattr(mudae, "analyze_reply_frame", lambda frame, mode: True)
+    report = mudae.run_replay(str(tmp_path))
+    assert (report['frames'], report['commands'], report['accuracy']) == (3, 1, 1.0)
+    recorder.close()
@@ -0,0 +1,205 @@
+def typed_commands(engine):
+    return [argument for _, action, argument in engine.input_backend.events if action == 'type']
+
+
+def add_instance(mudae, engine, name="a", w_interval=3600, rolls_interval=180):
+    engine.instances[name] = mudae.MudaeInstance(name, (100, 100, 600, 80), w_interval, rolls_interval)
+    return engine.instances[name]
+
+
+def toggle_during_first_send(engine, toggle):
+    """Run toggle() from inside the first command typed, i.e. while the dispatcher is mid-send"""
+    device = engine.input_backend
+    type_text = device.type_text
+    toggled = []
+
+    def type_and_toggle(text):
+        type_text(text)
+        if not toggled:
+            toggled.append(text)
+            toggle()
+
+    device.type_text = type_and_toggle
+
+
+def run_for(engine, seconds):
+    engine.run_until(engine.clock.monotonic() + seconds)
+
+
+def test_commands_follow_their_intervals(mudae, make_engine):
+    engine = make_engine()
+    add_instance(mudae, engine)
+    engine.start_instance("a")
+    run_for(engine, 1800)
+
+    commands = typed_commands(engine)
+    assert commands.count(".w") == 1
+    assert commands.count(".rolls") == 11  # At 0, 180, ..., 1800 seconds
+
+
+def test_pause_and_resume_during_send_keeps_one_chain(mudae, make_engine):
+    undisturbed = make_engine()
+    add_instance(mudae, undisturbed)
+    undisturbed.start_instance("a")
+    run_for(undisturbed, 1800)
+
+    engine = make_engine()
+    add_instance(mudae, engine)
+    engine.start_instance("a")
+    toggle_during_first_send(engine, lambda: (engine.pause_instance("a", True), engine.pause_instance("a", False)))
+    run_for(engine, 1800)
+
+    assert typed_commands(engine).count(".w") == 1
+    assert typed_commands(engine).count(".rolls") == typed_commands(undisturbed).count(".rolls")
+
+
+def test_stop_and_start_during_send_keeps_one_chain(mudae, make_engine):
+    engine = make_engine()
+    add_instance(mudae, engine)
+    engine.start_instance("a")
+    toggle_during_first_send(engine, lambda: (engine.stop_instance("a"), engine.start_instance("a")))
+    run_for(engine, 1800)
+
+    assert typed_commands(engine).count(".w") == 1
+    assert typed_commands(engine).count(".rolls") == 11
+
+
+def test_pause_during_send_stops_the_chain_until_resumed(mudae, make_engine):
+    engine = make_engine()
+    add_instance(mudae, engine)
+    engine.start_instance("a")
+    toggle_during_first_send(engine, lambda: engine.pause_instance("a", True))
+    run_for(engine, 1800)
+    assert typed_commands(engine) == [".w", ".rolls"]  # The batch in flight still completes
+
+    engine.pause_instance("a", False)
+    run_for(engine, 1800)
+    assert typed_commands(engine).count(".rolls") == 11
+
+
+def test_cancel_drops_pending_commands(mudae):
+    clock = mudae.VirtualClock()
+    scheduler = mudae.CommandScheduler(clock=clock.monotonic)
+    scheduler.schedule("a", ".w", 10)
+    scheduler.schedule("b", ".w", 20)
+    scheduler.cancel("a")
+    assert scheduler.pop_until(100) == (20, "b", ".w")
+    assert scheduler.pop_until(100) is None
+
+
+def test_schedule_with_stale_generation_is_rejected(mudae):
+    scheduler = mudae.CommandScheduler(clock=mudae.VirtualClock().monotonic)
+    generation = scheduler.generation("a")
+    scheduler.replace("a", [(".rolls", 5)])
+    assert not scheduler.schedule("a", ".w", 1, generation=generation)
+    assert scheduler.schedule("a", ".w", 1, generation=scheduler.generation("a"))
+    assert [scheduler.pop_until(100), scheduler.pop_until(100), scheduler.pop_until(100)] == \
+        [(1, "a", ".w"), (5, "a", ".rolls"), None]
+
+
+
+def fail_clicks_in(engine, instance):
+    """Make the input device raise whenever it clicks into an instance's chat region"""
+    device = engine.input_backend
+    click = device.click
+    x, y, w, h = instance.chat_region
+
+    def flaky_click(click_x, click_y):
+        if x <= click_x < x + w and y <= click_y < y + h:
+            device.events.append((engine.clock.monotonic(), 'failed click', (click_x, click_y)))
+            raise OSError("window gone")
+        click(click_x, click_y)
+
+    device.click = flaky_click
+
+
+def test_retries_are_queued_with_backoff(mudae, make_engine):
+    engine = make_engine(retry_attempts=3, retry_backoff=0.5)
+    broken = add_instance(mudae, engine, "broken")
+    fail_clicks_in(engine, broken)
+    engine.start_instance("broken")
+    run_for(engine, 5)  # Given up after 1.5 seconds, tried again failed_command_delay later
+
+    attempts = [when for when, action, _ in engine.input_backend.events if action == 'failed click']
+    assert len(attempts) == 3
+    gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+    assert gaps == [0.5, 1.0]
+    assert engine.metrics.counter('retries', "broken") == 2
+    assert engine.metrics.counter('commands_failed', "broken") == 2  # .w and .rolls
+
+
+def test_failing_instance_does_not_hold_up_others(mudae, make_engine):
+    engine = make_engine(retry_attempts=3, retry_backoff=30)
+    broken = add_instance(mudae, engine, "broken")
+    engine.instances["healthy"] = mudae.MudaeInstance("healthy", (100, 300, 600, 80), 3600, 180)
+    fail_clicks_in(engine, broken)
+    engine.start_instance("broken")
+    engine.start_instance("healthy")
+    run_for(engine, 1800)
+
+    lateness = engine.metrics.histogram('dispatch_lateness_seconds', "healthy")
+    assert lateness.max < 1  # Only ever waits for another instance's click-type-enter, never a backoff
+    assert typed_commands(engine).count(".rolls") == 11
+
+
+def test_take_due_only_touches_one_instance(mudae):
+    scheduler = mudae.CommandScheduler(clock=mudae.VirtualClock().monotonic)
+    for index in range(1000):
+        scheduler.schedule(f"other-{index}", ".rolls", index % 7)
+    scheduler.schedule("a", ".rolls", 3)
+    scheduler.schedule("a", ".w", 2)
+    scheduler.schedule("a", ".mu", 50)
+
+    assert scheduler.take_due("a", 10) == [(2, ".w"), (3, ".rolls")]
+    assert scheduler.take_due("a", 10) == []
+    popped = []
+    while True:
+        entry = scheduler.pop_until(100)
+        if entry is None:
+            break
+        popped.append(entry)
+    assert len(popped) == 1001 and popped[-1] == (50, "a", ".mu")
+
+
+def test_every_command_of_a_batch_is_verified(mudae, make_engine):
+    engine = make_engine(verify_enabled=True, coalesce_window=5)
+    verified = []
+    engine.schedule_verification = lambda instance, commands: verified.append(list(commands))
+    add_instance(mudae, engine)
+    engine.start_instance("a")
+    run_for(engine, 1)
+    assert verified == [[".w", ".rolls"]]
+
+
+def test_intervals_stay_writable_and_settings_reload(mudae):
+    instance = mudae.MudaeInstance("a", (0, 0, 10, 10), 3600, 180)
+    instance.rolls_interval = 120
+    instance.w_interval = 1800
+    assert instance.timetable == [[".w", 1800, 0], [".rolls", 120, 0]]
+
+    rolls_only = mudae.MudaeInstance("b", (0, 0, 10, 10), None, None, timetable=[[".rolls", 60, 0]])
+    data = rolls_only.to_dict()
+    assert 'w_interval' not in data and data['rolls_interval'] == 60
+    assert mudae.MudaeInstance.from_dict(data).timetable == [[".rolls", 60, 0]]
+
+    legacy = {'name': "c", 'chat_region': [0, 0, 10, 10], 'w_interval': 3600, 'rolls_interval': 180}
+    assert mudae.MudaeInstance.from_dict(legacy).timetable == [[".w", 3600, 0], [".rolls", 180, 0]]
+
+
+def test_dispatch_error_does_not_stop_the_fleet(mudae, make_engine):
+    engine = make_engine()
+    add_instance(mudae, engine, "broken")
+    engine.instances["healthy"] = mudae.MudaeInstance("healthy", (100, 300, 600, 80), 3600, 180)
+
+    class FailingRecorder:
+        def command(self, instance_name, *args):
+            if instance_name == "broken":
+                raise OSError("disk full")
+
+    engine.recorder = FailingRecorder()
+    engine.start_instance("broken")
+    engine.start_instance("healthy")
+    run_for(engine, 1800)
+
+    assert engine.metrics.counter('commands_sent', "healthy") >= 11  # .w, then .rolls every 180 seconds
+    assert engine.metrics.counter('commands_sent', "broken") > 1  # Rescheduled after each failure
@@ -0,0 +1,32 @@
+import queue
+
+
+def test_state_relay_forwards_sends_and_leaves_the_state_file_alone(mudae, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clock = mudae.VirtualClock()
+    events = queue.Queue()
+    relay = mudae.ShardStateRelay(":1", {"a": {".w": clock.time() - 100}}, events, clock)
+    instance = mudae.MudaeInstance("a", (0, 0, 100, 40), 3600, 180)
+
+    relay.load()
+    relay.restore(instance)
+    assert instance.seconds_until(".w", clock.monotonic()) == 3500
+
+    instance.mark_sent(".rolls", clock.monotonic())
+    relay.record(instance, ".rolls")
+    kind, display, name, command, sent_wall = events.get_nowait()
+    assert (kind, display, name, command) == ('sent', ":1", "a", ".rolls")
+    assert abs(sent_wall - clock.time()) < 0.01
+
+    relay.forget("a")
+    relay.clear()
+    relay.flush()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shards_keep_pinned_instances_and_balance_the_rest(mudae, tmp_path):
+    coordinator = mudae.ShardCoordinator([":1", ":2"], log_file=None, echo_log=False,
+                                         state_file=str(tmp_path / "state.json"))
+    instances = {name: mudae.MudaeInstance(name, (0, 0, 100, 40), 3600, 180, display=display)
+                 for name, display in [("a", ":2"), ("b", None), ("c", None), ("d", None)]}
+    assert coordinator.assign(instances) == {":1": ["b", "c"], ":2": ["a", "d"]}
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+
+from conftest import SCRIPT
+
+
+def test_import_loads_neither_pyautogui_nor_the_vision_stack():
+    code = (
+        "import importlib.util, sys\n"
+        f"spec = importlib.util.spec_from_file_location('mudae_automation', {SCRIPT!r})\n"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+        "print(sorted(name for name in ('pyautogui', 'pyscreeze', 'cv2', 'numpy') if name in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_settings_on_a_lazy_module_wait_for_its_import(mudae, tmp_path, monkeypatch):
+    (tmp_path / "lazy_settings_probe.py").write_text("PAUSE = 0.5\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = mudae.LazyModule("lazy_settings_probe")
+    module.PAUSE = 0.1
+    assert "lazy_settings_probe" not in sys.modules
+    assert module.PAUSE == 0.1
+    assert sys.modules["lazy_settings_probe"].PAUSE == 0.1
+    monkeypatch.delitem(sys.modules, "lazy_settings_probe")
+
+
+def test_startup_report_reads_sys_modules(mudae):
+    import numpy  # noqa: F401
+
+    assert "numpy=True" in mudae.StartupProfile(0).report()
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def template_dir(mudae, monkeypatch, tmp_path):
+    """Point the process-wide template verifier at an empty directory"""
+    monkeypatch.setattr(mudae, "_template_verifier", mudae.TemplateVerifier(template_dir=str(tmp_path)))
+    return tmp_path
+
+
+def test_template_mode_falls_back_to_ocr_without_templates(mudae, template_dir):
+    assert mudae.effective_verify_mode("template") == "ocr"
+    assert mudae.effective_verify_mode("ocr") == "ocr"
+
+
+def test_template_mode_is_kept_with_templates(mudae, monkeypatch, template_dir):
+    template = np.zeros((8, 8, 3), dtype=np.uint8)
+    mudae.cv2.imwrite(str(template_dir / "embed.png"), template)
+    monkeypatch.setattr(mudae, "_template_verifier", mudae.TemplateVerifier(template_dir=str(template_dir)))
+    assert mudae.effective_verify_mode("template") == "template"
+
+
+def test_template_instance_without_templates_is_not_failed_by_default(mudae, make_engine, template_dir):
+    engine = make_engine()
+    instance = mudae.MudaeInstance("a", (0, 0, 64, 48), 3600, 180, verify_mode="template")
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    instance.change_detector.changed(frame)
+
+    engine.analyze_frame(instance, frame)  # Goes through the OCR change gate instead of matching nothing
+    assert instance.ocr_skipped == 1
+    assert engine.warned_no_templates
+
+
+def test_delayed_jobs_do_not_hold_workers_while_waiting(mudae):
+    pool = mudae.VerificationPool(workers=2)
+    finished = []
+    started = time.monotonic()
+    for index in range(10):
+        assert pool.submit_after(0.2, finished.append, index)
+    deadline = time.monotonic() + 5
+    while len(finished) < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - started
+    pool.close()
+
+    assert sorted(finished) == list(range(10))
+    assert elapsed < 0.8  # Sleeping in 2 workers would take 10 * 0.2 / 2 = 1 second
+
+
+def test_backlog_is_bounded(mudae):
+    pool = mudae.VerificationPool(workers=1, max_pending=2)
+    assert pool.submit_after(10, print)
+    assert pool.submit_after(10, print)
+    assert not pool.submit_after(10, print)
+    pool.close()
+    assert not pool.submit_after(0, print)
+
+
+def test_close_waits_for_running_jobs(mudae):
+    pool = mudae.VerificationPool(workers=1)
+    started, finished = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        time.sleep(0.2)
+        finished.set()
+
+    pool.submit_after(0, job)
+    assert started.wait(5)
+    pool.close()
+    assert finished.is_set()
+
+
+def test_process_workers_are_spawned(mudae):
+    pool = mudae.VerificationPool(use_processes=True, workers=1)
+    try:
+        assert pool.processes._mp_context.get_start_method() == "spawn"
+    finally:
+        pool.close()
+
+
+def test_verification_queue_wait_is_measured(mudae, make_engine):
+    engine = make_engine(verify_delay=0)
+    engine.verification_pool = mudae.VerificationPool(workers=1)
+    instance = mudae.MudaeInstance("a", (0, 0, 64, 48), 3600, 180)  # Stopped: each job only measures and returns
+    for _ in range(3):
+        engine.schedule_verification(instance, [".w"])
+    deadline = time.monotonic() + 5
+    while engine.verification_pool.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    engine.verification_pool.close()
+    assert engine.metrics.histogram('verify_queue_seconds', "a").count == 3